@@ -7,8 +7,14 @@ NTP.py - NTP Management compatible with main.py
 
 import os
 import json
-import requests
-from bs4 import BeautifulSoup
+from html import escape
+
+from bulk import dispatch
+from fleet import get_miner, miner_names, web_url
+from luci_forms import find_token, form_fields
+import luci_schema
+from luci_session import LoginError, ensure_authenticated, run_with_session
+from metrics import luci_phase
 
 # ===========================
 # Configuration - Compatible with main.py
@@ -18,94 +24,63 @@ DEFAULT_NTP_SERVERS = ["ir.pool.ntp.org"]
 def _get_miner_base(miner_name):
     """Get miner base URL - Compatible with main.py"""
     try:
-        from main import port_map, MINER_IP
-        miner_port = port_map.get(miner_name)
+        miner = get_miner(miner_name)
         
-        if not miner_port:
+        if not miner:
             return None, None, f"Port not found for miner {miner_name}"
         
-        if not MINER_IP:
+        base = web_url(miner)
+        if not base:
             return None, None, "MINER_IP not set"
         
-        base = f"https://{MINER_IP}:{miner_port}"
-        return base, miner_port, None
+        return base, miner["web_port"], None
         
     except Exception as e:
         return None, None, f"Error: {str(e)}"
 
-def _session_noverify():
-    """Create session without verify - Compatible with main.py"""
-    s = requests.Session()
-    s.verify = False
-    requests.packages.urllib3.disable_warnings()
-    return s
-
-def login_to_miner(miner_name, username, password):
-    """Login to miner - Compatible with main.py"""
-    base, port, err = _get_miner_base(miner_name)
-    if err:
-        return None, err
-    
-    login_url = f"{base}/cgi-bin/luci"
-    session = _session_noverify()
-    
-    try:
-        # Initial GET to get cookies
-        session.get(login_url, timeout=10)
-    except Exception as e:
-        return None, f"GET login page failed: {e}"
-    
-    # Different payloads for compatibility
-    payloads = [
-        {"luci_username": username, "luci_password": password},
-        {"username": username, "password": password},
-    ]
-    
-    for payload in payloads:
-        try:
-            resp = session.post(login_url, data=payload, timeout=10, allow_redirects=False)
-            if resp.status_code in (200, 302, 303):
-                return session, None
-        except Exception as e:
-            continue
-    
-    return None, "Login failed with all payloads"
+def _timezone_keys(miner_name, page):
+    """The timezone field key of this firmware; all candidates when the page does not show one"""
+    key = luci_schema.get(miner_name, "tz_key")
+    if key and f'name="{key}"' in page:
+        return [key]
+    if key:
+        luci_schema.forget(miner_name, "tz_key")
+    fields = form_fields(page, "cbid.system.")
+    found = [k for k in luci_schema.TZ_KEYS if k in fields]
+    if found:
+        luci_schema.learn(miner_name, "tz_key", found[0])
+        return found[:1]
+    return list(luci_schema.TZ_KEYS)
 
 def super_ntp_update(miner_name, enable_ntp=True, custom_servers=None, timezone="Asia/Tehran", username="admin", password="admin"):
     """
     🚀 Super NTP Update - Compatible with main.py
     """
-    try:
-        # 1. Login to miner
-        session, err = login_to_miner(miner_name, username, password)
-        if not session:
-            return {"success": False, "message": f"❌ Login error: {err}"}
-        
-        # 2. Get base URL
-        base, port, err2 = _get_miner_base(miner_name)
-        if err2:
-            return {"success": False, "message": f"❌ {err2}"}
-        
+    # 1. Check miner (login itself goes through the shared session pool)
+    base, port, err = _get_miner_base(miner_name)
+    if err:
+        return {"success": False, "message": f"❌ Login error: {err}"}
+
+    def update(session, base):
         system_url = f"{base}/cgi-bin/luci/admin/system/system"
         
-        # 3. Get system page
+        # 2. Get system page
         try:
-            response = session.get(system_url, timeout=10)
-            if response.status_code != 200:
-                return {"success": False, "message": f"❌ Page load error: {response.status_code}"}
+            with luci_phase("ntp", "page_get"):
+                response = session.get(system_url, timeout=10)
         except Exception as e:
             return {"success": False, "message": f"❌ Page load error: {e}"}
+        ensure_authenticated(response)
+        if response.status_code != 200:
+            return {"success": False, "message": f"❌ Page load error: {response.status_code}"}
         
-        soup = BeautifulSoup(response.text, "html.parser")
-        
-        # 4. Get security token
-        token_input = soup.find("input", {"name": "token"})
-        token = token_input["value"] if token_input and token_input.has_attr("value") else ""
+        # 3. Get security token
+        token = find_token(response.text)
         
         if not token:
             return {"success": False, "message": "❌ Security token not found"}
         
-        # 5. Prepare data
+        # 4. Prepare data
         servers = custom_servers or DEFAULT_NTP_SERVERS
         form_data = {
             "token": token,
@@ -113,13 +88,8 @@ def super_ntp_update(miner_name, enable_ntp=True, custom_servers=None, timezone=
             "cbi.apply": "Save & Apply",
         }
         
-        # Set timezone
-        tz_keys = [
-            "cbid.system.cfg02e48a.zonename",
-            "cbid.system.system.zonename", 
-            "cbid.system.timezone"
-        ]
-        for key in tz_keys:
+        # Set timezone (key learned per firmware, see luci_schema.py)
+        for key in _timezone_keys(miner_name, response.text):
             form_data[key] = timezone
         
         # Enable/disable NTP
@@ -134,42 +104,45 @@ def super_ntp_update(miner_name, enable_ntp=True, custom_servers=None, timezone=
             form_data["cbid.system.ntp.server"] = servers[0]
             form_data["cbid.system.ntp.server.1"] = servers[0]
         
-        # 6. Send request
+        # 5. Send request
         try:
-            post_response = session.post(system_url, data=form_data, timeout=15)
-            
-            if post_response.status_code in (200, 302):
-                return {
-                    "success": True, 
-                    "message": f"✅ NTP updated for miner {miner_name}",
-                    "ntp_enabled": enable_ntp,
-                    "servers": servers,
-                    "timezone": timezone,
-                    "miner": miner_name
-                }
-            else:
-                return {"success": False, "message": f"❌ Server error: {post_response.status_code}"}
-                
+            with luci_phase("ntp", "form_post"):
+                post_response = session.post(system_url, data=form_data, timeout=15)
         except Exception as e:
             return {"success": False, "message": f"❌ Send error: {e}"}
+        ensure_authenticated(post_response)
         
+        if post_response.status_code in (200, 302):
+            return {
+                "success": True, 
+                "message": f"✅ NTP updated for miner {miner_name}",
+                "ntp_enabled": enable_ntp,
+                "servers": servers,
+                "timezone": timezone,
+                "miner": miner_name
+            }
+        else:
+            return {"success": False, "message": f"❌ Server error: {post_response.status_code}"}
+
+    try:
+        return run_with_session(miner_name, username, password, update, operation="ntp")
+    except LoginError as e:
+        return {"success": False, "message": f"❌ Login error: {e}"}
     except Exception as e:
         return {"success": False, "message": f"❌ Unknown error: {str(e)}"}
 
-def bulk_super_ntp_update(miner_names, enable_ntp=True, custom_servers=None, timezone="Asia/Tehran", username="admin", password="admin"):
+def bulk_ntp_update(names, emit, enable_ntp=True, custom_servers=None, timezone="Asia/Tehran", username="admin", password="admin"):
     """
-    Bulk update miners - Compatible with main.py
+    super_ntp_update for many miners (None: the whole fleet) on a bounded
+    pool, see bulk.dispatch. Blocks until done; returns the summary.
     """
-    results = []
-    for miner in miner_names:
-        result = super_ntp_update(miner, enable_ntp, custom_servers, timezone, username, password)
-        results.append({
-            "miner": miner,
-            "success": result.get("success", False),
-            "message": result.get("message", "")
-        })
-    
-    return results
+    if names is None:
+        names = miner_names()
+
+    def one(miner):
+        return super_ntp_update(miner, enable_ntp, custom_servers, timezone, username, password)
+
+    return dispatch(names, one, emit)
 
 # ===========================
 # Existing functions for compatibility
@@ -194,7 +167,7 @@ def get_ntp_html():
     return '''
 <!-- NTP Modal -->
 <div id="ntpModalOverlay" style="display:none; position:fixed; left:0; top:0; right:0; bottom:0; background:rgba(0,0,0,0.6); z-index:10000;" onclick="closeNtpModal()"></div>
-<div id="ntpModal" class="modal" style="display:none; position:fixed; z-index:10001; left:50%; top:50%; transform:translate(-50%,-50%); width: min(500px, 96%); background:linear-gradient(135deg, #1e3a8a 0%, #3730a3 100%); padding:25px; border-radius:20px; border:2px solid #4f46e5; box-shadow:0 20px 60px rgba(0,0,0,0.5); color:white;">
+<div id="ntpModal" data-miners="''' + escape(json.dumps(miner_names())) + '''" class="modal" style="display:none; position:fixed; z-index:10001; left:50%; top:50%; transform:translate(-50%,-50%); width: min(500px, 96%); background:linear-gradient(135deg, #1e3a8a 0%, #3730a3 100%); padding:25px; border-radius:20px; border:2px solid #4f46e5; box-shadow:0 20px 60px rgba(0,0,0,0.5); color:white;">
     
     <!-- Header -->
     <div style="display:flex; justify-content:space-between; align-items:center; margin-bottom:25px; border-bottom:2px solid rgba(255,255,255,0.2); padding-bottom:15px;">
@@ -296,15 +269,12 @@ function runSuperUpdate() {
         return;
     }
 
-    // Use miners defined in main.py
-    const miners = ['131', '132', '133', '65', '66', '70'];
+    // Use miners defined in fleet.json
+    const miners = JSON.parse(document.getElementById('ntpModal').dataset.miners);
     const progressBar = document.getElementById('ntpProgressBar');
     const progressText = document.getElementById('ntpProgressText');
     const statusText = document.getElementById('currentStatus');
     
-    let completed = 0;
-    const total = miners.length;
-    
     // Reset progress
     progressBar.style.width = '0%';
     progressText.textContent = '0%';
@@ -313,76 +283,63 @@ function runSuperUpdate() {
     
     isUpdating = true;
     
-    console.log(`🚀 Starting super update for ${total} miners...`);
+    console.log(`🚀 Starting super update for ${miners.length} miners...`);
     
-    // Show immediate feedback
-    setTimeout(() => {
-        statusText.textContent = '⏳ Connecting to miners...';
-    }, 100);
-    
-    miners.forEach((miner, index) => {
-        setTimeout(() => {
-            statusText.textContent = `🔄 Updating miner ${miner}...`;
-            statusText.style.color = '#fbbf24';
-            
-            fetch('/update_ntp', {
-                method: 'POST',
-                headers: {'Content-Type': 'application/json'},
-                body: JSON.stringify({
-                    miner: miner,
-                    ntp_enabled: enableNTP,
-                    ntp_servers: ntpServer ? [ntpServer] : [], // Single server
-                    timezone: timezone
-                })
-            })
-            .then(r => r.json())
-            .then(data => {
-                completed++;
-                const progress = Math.round((completed / total) * 100);
-                progressBar.style.width = progress + '%';
-                progressText.textContent = progress + '%';
-                
-                console.log(`✅ Miner ${miner}:`, data);
-                
-                if (data.success) {
-                    statusText.textContent = `✅ ${miner}: ${data.message}`;
-                    statusText.style.color = '#86efac';
-                } else {
-                    statusText.textContent = `❌ ${miner}: ${data.message}`;
-                    statusText.style.color = '#fca5a5';
-                }
-                
-                if (completed === total) {
-                    isUpdating = false;
-                    setTimeout(() => {
-                        statusText.textContent = '🎉 All miners updated successfully!';
-                        statusText.style.color = '#86efac';
-                        setTimeout(() => {
-                            alert('✅ Super NTP Update completed successfully!');
-                            closeNtpModal();
-                        }, 1000);
-                    }, 500);
-                }
-            })
-            .catch(err => {
-                completed++;
-                const progress = Math.round((completed / total) * 100);
-                progressBar.style.width = progress + '%';
-                progressText.textContent = progress + '%';
-                
-                console.error(`❌ Miner ${miner}:`, err);
-                statusText.textContent = `❌ Error on ${miner}`;
+    function onEvent(data) {
+        if (data.summary) {
+            const s = data.summary;
+            isUpdating = false;
+            progressBar.style.width = '100%';
+            progressText.textContent = '100%';
+            if (s.error || s.failed) {
+                statusText.textContent = s.error ? `❌ ${s.error}` : `⚠️ ${s.ok}/${s.total} miners updated`;
                 statusText.style.color = '#fca5a5';
-                
-                if (completed === total) {
-                    isUpdating = false;
-                    setTimeout(() => {
-                        alert('⚠️ Some miners may not be updated');
-                        closeNtpModal();
-                    }, 500);
-                }
-            });
-        }, index * 800); // 800ms delay between requests
+                setTimeout(() => {
+                    alert('⚠️ Some miners may not be updated');
+                }, 500);
+                return;
+            }
+            statusText.textContent = `🎉 All ${s.total} miners updated in ${s.seconds}s!`;
+            statusText.style.color = '#86efac';
+            setTimeout(() => {
+                alert('✅ Super NTP Update completed successfully!');
+                closeNtpModal();
+            }, 1000);
+            return;
+        }
+        const progress = Math.round((data.done / data.total) * 100);
+        progressBar.style.width = progress + '%';
+        progressText.textContent = progress + '%';
+        
+        console.log(`✅ Miner ${data.miner}:`, data.result);
+        
+        const message = data.result.message || data.result.error;
+        if (data.ok) {
+            statusText.textContent = `✅ ${data.miner}: ${message}`;
+            statusText.style.color = '#86efac';
+        } else {
+            statusText.textContent = `❌ ${data.miner}: ${message}`;
+            statusText.style.color = '#fca5a5';
+        }
+    }
+    
+    // یک درخواست؛ سرور همه ماینرها را موازی در یک job به‌روز می‌کند
+    fetch('/update_ntp_bulk', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({
+            miners: miners,
+            ntp_enabled: enableNTP,
+            ntp_servers: ntpServer ? [ntpServer] : [], // Single server
+            timezone: timezone
+        })
+    })
+    .then(response => followJob(response, onEvent))
+    .catch(err => {
+        isUpdating = false;
+        console.error('❌ NTP bulk update:', err);
+        statusText.textContent = `❌ ${err.message || err}`;
+        statusText.style.color = '#fca5a5';
     });
 }
 </script>
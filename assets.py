@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+assets.py - Fingerprinted, precompressed static CSS/JS for the dashboard
+
+The modal HTML generators inline a lot of CSS and JS that never changes.
+externalize() moves those blocks into content-hashed files that are
+compressed once at startup and served with Cache-Control: immutable.
+"""
+
+import gzip
+import hashlib
+import re
+
+from flask import Response, request
+
+ASSET_PREFIX = "/assets/"
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+MIN_COMPRESS_SIZE = 512
+
+_STYLE_RE = re.compile(r"<style>(.*?)</style>", re.S)
+_SCRIPT_RE = re.compile(r"<script>(.*?)</script>", re.S)
+
+# name -> {"mimetype", "etag", "identity", "gzip"}
+_assets = {}
+
+def _has_template_syntax(text):
+    return "{{" in text or "{%" in text or "{#" in text
+
+def register(stem, content, ext, mimetype):
+    """Store one asset under a content-hashed name and return that name"""
+    raw = content.encode("utf-8")
+    digest = hashlib.sha256(raw).hexdigest()[:12]
+    name = f"{stem}.{digest}.{ext}"
+    if name not in _assets:
+        variants = {"identity": raw}
+        if len(raw) >= MIN_COMPRESS_SIZE:
+            variants["gzip"] = gzip.compress(raw, compresslevel=9, mtime=0)
+        _assets[name] = {"mimetype": mimetype, "etag": digest, **variants}
+    return name
+
+def externalize(html, stem="panel"):
+    """
+    Move inline <style>/<script> blocks of a page into static assets.
+
+    All CSS goes into one stylesheet linked from <head>. Every script
+    becomes its own deferred file at its original position, so scripts
+    still run one after another in document order.
+    """
+    css_parts = []
+
+    def take_style(m):
+        if _has_template_syntax(m.group(1)):
+            return m.group(0)
+        css_parts.append(m.group(1))
+        return ""
+
+    counter = [0]
+
+    def take_script(m):
+        if _has_template_syntax(m.group(1)):
+            return m.group(0)
+        counter[0] += 1
+        name = register(f"{stem}-{counter[0]}", m.group(1), "js", "application/javascript")
+        return f'<script src="{ASSET_PREFIX}{name}" defer></script>'
+
+    html = _STYLE_RE.sub(take_style, html)
+    html = _SCRIPT_RE.sub(take_script, html)
+    if css_parts:
+        name = register(stem, "\n".join(css_parts), "css", "text/css")
+        link = f'<link rel="stylesheet" href="{ASSET_PREFIX}{name}">\n'
+        html = html.replace("</head>", link + "</head>", 1)
+    return html
+
+def _pick_encoding(asset):
+    if "gzip" in asset and request.accept_encodings["gzip"]:
+        return "gzip"
+    return "identity"
+
+def _etag(asset, encoding):
+    # each body gets its own strong ETag; a cache must not swap them
+    return asset["etag"] if encoding == "identity" else f"{asset['etag']}-{encoding}"
+
+def serve_asset(name, build=None):
+    """
+    Flask view body for ASSET_PREFIX + name.
+
+    Assets exist once the page that holds them was built; after a restart a
+    cached page can ask first, so on a miss build() (which externalizes the
+    page again) is called once before answering 404.
+    """
+    asset = _assets.get(name)
+    if asset is None and build is not None:
+        build()
+        asset = _assets.get(name)
+    if asset is None:
+        return Response("Not found", status=404, mimetype="text/plain")
+    encoding = _pick_encoding(asset)
+    etag = _etag(asset, encoding)
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        resp = Response(asset[encoding], mimetype=asset["mimetype"])
+        if encoding != "identity":
+            resp.headers["Content-Encoding"] = encoding
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = CACHE_CONTROL
+    resp.headers["Vary"] = "Accept-Encoding"
+    return resp
+
+def compress_response(body, mimetype):
+    """gzip a dynamic response when the client accepts it"""
+    raw = body.encode("utf-8") if isinstance(body, str) else body
+    if len(raw) >= MIN_COMPRESS_SIZE and request.accept_encodings["gzip"]:
+        resp = Response(gzip.compress(raw, compresslevel=6), mimetype=mimetype)
+        resp.headers["Content-Encoding"] = "gzip"
+    else:
+        resp = Response(raw, mimetype=mimetype)
+    resp.headers["Vary"] = "Accept-Encoding"
+    return resp
@@ -0,0 +1,7 @@
+"""
+bench - Local benchmarks for the panel (no network needed)
+
+Run from the repository root, e.g.
+
+    python -m bench.poll_bench
+"""
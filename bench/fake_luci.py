@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+fake_luci.py - Local HTTPS stand-in for the miners' LuCI web interface
+
+Serves just enough of LuCI for the pools, reboot and NTP flows: the login
+page and credential POST (302 + sysauth cookie), the btminer pools page,
+the reboot page/call and the system page, each with a form token. N
+listeners run in one process; one JSON line {"ports": [...]} is printed
+when they are ready.
+
+    python -m bench.fake_luci --count 100 --handshake-delay 0.05 --delay 0.01
+
+  --handshake-delay  extra cost of a full TLS handshake (not applied when
+                     the client resumed a session)
+  --delay/--jitter   delay before every response
+  --page-bytes       size of the HTML pages
+  --login-fields     luci / plain: accept only luci_username+luci_password or
+                     username+password (default: either)
+  --reboot-format    form / json: how reboot/call wants its token (default: either)
+  --ciphers          OpenSSL cipher string the server offers (TLS 1.2), e.g.
+                     AES128-SHA:AES256-SHA for old lighttpd/uhttpd firmware
+  --tls-max          highest TLS version: 1.2 or 1.3 (default)
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import secrets
+import ssl
+import sys
+
+from discovery import raise_nofile_limit
+from bench.sim_miner import spawn
+
+CERT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "certs")
+CERT_FILE = os.path.join(CERT_DIR, "localhost.pem")
+KEY_FILE = os.path.join(CERT_DIR, "localhost.key")
+MAX_HEADER = 65536
+
+LOGIN_PAGE = """<!DOCTYPE html><html><head><title>LuCI</title></head><body>
+<form method="post" action="/cgi-bin/luci">
+<input name="luci_username" type="text"><input name="luci_password" type="password">
+<input type="submit" value="Login"></form>{pad}</body></html>"""
+
+FORM_PAGE = """<!DOCTYPE html><html><head><title>{title} - LuCI</title></head><body>
+<form method="post" action="{path}" enctype="multipart/form-data">
+<input type="hidden" name="token" value="{token}">
+<input type="hidden" name="cbi.submit" value="1">
+{fields}
+<input class="cbi-button cbi-button-apply" type="submit" name="cbi.apply" value="Save &amp; Apply">
+</form>{pad}</body></html>"""
+
+REBOOT_PAGE = """<!DOCTYPE html><html><head><title>Reboot - LuCI</title></head><body>
+<script type="text/javascript">//<![CDATA[
+var L = {{ env: {{ token: '{token}', sessionid: '{sid}' }} }};
+XHR.get('/cgi-bin/luci/admin/system/reboot/call', {{ token: '{token}' }}, function() {{}});
+//]]></script>{pad}</body></html>"""
+
+def _pad(size):
+    return "<!-- " + "x" * max(0, size - 9) + " -->" if size > 0 else ""
+
+def _pools_fields():
+    out = []
+    for n in (1, 2, 3):
+        for key in ("url", "user", "pw"):
+            out.append(f'<input type="text" name="cbid.pools.default.pool{n}{key}" id="cbid.pools.default.pool{n}{key}" value="">')
+    return "\n".join(out)
+
+def _system_fields():
+    return "\n".join([
+        '<select name="cbid.system.cfg02e48a.zonename"><option value="UTC">UTC</option>'
+        '<option value="Asia/Tehran">Asia/Tehran</option></select>',
+        '<input type="checkbox" name="cbid.system.ntp.enabled" value="1" checked>',
+        '<input type="hidden" name="cbi.cbe.system.ntp.enabled" value="1">',
+        '<input type="text" name="cbid.system.ntp.server" value="0.openwrt.pool.ntp.org">',
+    ])
+
+class Miner:
+    """State of one fake miner web interface"""
+
+    def __init__(self):
+        self.sessions = {}  # sysauth -> token
+        self.stats = {"logins": 0, "pools": 0, "reboots": 0, "ntp": 0}
+
+def _response(status, body=b"", headers=()):
+    reason = {200: "OK", 302: "Found", 400: "Bad Request", 403: "Forbidden", 404: "Not Found"}.get(status, "OK")
+    head = [f"HTTP/1.1 {status} {reason}", f"Content-Length: {len(body)}", "Content-Type: text/html; charset=utf-8"]
+    head.extend(headers)
+    return ("\r\n".join(head) + "\r\n\r\n").encode() + body
+
+def _login_ok(form, fields):
+    if fields == "luci":
+        return bool(form.get("luci_username"))
+    if fields == "plain":
+        return bool(form.get("username"))
+    return bool(form.get("luci_username") or form.get("username"))
+
+def _reboot_ok(headers, reboot_format):
+    is_json = headers.get("content-type", "").startswith("application/json")
+    if reboot_format == "form":
+        return not is_json
+    if reboot_format == "json":
+        return is_json
+    return True
+
+def handle_request(miner, method, path, headers, body, pad, login_fields="any", reboot_format="any"):
+    """Return (status, body, extra headers) for one request"""
+    cookie = headers.get("cookie", "")
+    sysauth = None
+    for part in cookie.split(";"):
+        name, _, value = part.strip().partition("=")
+        if name == "sysauth":
+            sysauth = value
+    token = miner.sessions.get(sysauth)
+    path = path.split("?", 1)[0]
+
+    if path.rstrip("/") == "/cgi-bin/luci":
+        if method == "POST":
+            form = dict(p.partition("=")[::2] for p in body.decode("latin-1").split("&") if p)
+            if _login_ok(form, login_fields):
+                sid, token = secrets.token_hex(16), secrets.token_hex(16)
+                miner.sessions[sid] = token
+                miner.stats["logins"] += 1
+                return 302, b"", (f"Set-Cookie: sysauth={sid}; path=/cgi-bin/luci/; HttpOnly",
+                                  f"Location: /cgi-bin/luci/;stok={sid}/admin/status/overview")
+            return 403, LOGIN_PAGE.format(pad=pad).encode(), ()
+        return 200, LOGIN_PAGE.format(pad=pad).encode(), ()
+
+    if not path.startswith("/cgi-bin/luci/admin/"):
+        return 404, b"Not found", ()
+    if token is None:
+        # LuCI answers unauthenticated admin requests with the login form
+        return 403, LOGIN_PAGE.format(pad=pad).encode(), ()
+
+    if path == "/cgi-bin/luci/admin/network/btminer":
+        if method == "POST":
+            miner.stats["pools"] += 1
+        page = FORM_PAGE.format(title="Pools", path=path, token=token, fields=_pools_fields(), pad=pad)
+        return 200, page.encode(), ()
+    if path == "/cgi-bin/luci/admin/system/system":
+        if method == "POST":
+            miner.stats["ntp"] += 1
+        page = FORM_PAGE.format(title="System", path=path, token=token, fields=_system_fields(), pad=pad)
+        return 200, page.encode(), ()
+    if path == "/cgi-bin/luci/admin/system/reboot":
+        return 200, REBOOT_PAGE.format(token=token, sid=sysauth, pad=pad).encode(), ()
+    if path == "/cgi-bin/luci/admin/system/reboot/call" and method == "POST":
+        if not _reboot_ok(headers, reboot_format):
+            return 400, b'{"result": false}', ()
+        miner.stats["reboots"] += 1
+        return 200, b'{"result": true}', ()
+    return 404, b"Not found", ()
+
+async def serve(args):
+    tls = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    tls.load_cert_chain(CERT_FILE, KEY_FILE)
+    if args.ciphers:
+        # OpenSSL 3 keeps SHA1/RSA-kx suites behind security level 0
+        tls.set_ciphers(f"{args.ciphers}:@SECLEVEL=0")
+    if args.tls_max == "1.2":
+        tls.maximum_version = ssl.TLSVersion.TLSv1_2
+    pad = _pad(args.page_bytes)
+
+    def make_handler(miner):
+        async def handle(reader, writer):
+            try:
+                ssl_object = writer.get_extra_info("ssl_object")
+                if args.handshake_delay and ssl_object is not None and not ssl_object.session_reused:
+                    await asyncio.sleep(args.handshake_delay)
+                while True:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                    if len(head) > MAX_HEADER:
+                        break
+                    lines = head.decode("latin-1").split("\r\n")
+                    method, path, _ = (lines[0].split(" ", 2) + ["", ""])[:3]
+                    headers = {}
+                    for line in lines[1:]:
+                        if ":" in line:
+                            k, v = line.split(":", 1)
+                            headers[k.strip().lower()] = v.strip()
+                    length = int(headers.get("content-length") or 0)
+                    body = await reader.readexactly(length) if length else b""
+                    delay = args.delay + (random.uniform(-args.jitter, args.jitter) if args.jitter else 0)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    status, payload, extra = handle_request(
+                        miner, method, path, headers, body, pad, args.login_fields, args.reboot_format)
+                    writer.write(_response(status, payload, extra))
+                    await writer.drain()
+                    if headers.get("connection", "").lower() == "close":
+                        break
+            except (asyncio.IncompleteReadError, ConnectionError, ssl.SSLError, asyncio.LimitOverrunError):
+                pass
+            finally:
+                writer.close()
+        return handle
+
+    servers = []
+    for _ in range(args.count):
+        servers.append(await asyncio.start_server(make_handler(Miner()), "127.0.0.1", 0, ssl=tls, backlog=1024))
+    ports = [s.sockets[0].getsockname()[1] for s in servers]
+    sys.stdout.write(json.dumps({"ports": ports}) + "\n")
+    sys.stdout.flush()
+    await asyncio.Event().wait()
+
+def start_fake_luci(count, **options):
+    """Fake LuCI servers in a subprocess; returns (process, ports)"""
+    return spawn("bench.fake_luci", count, **options)
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake LuCI HTTPS servers on localhost")
+    parser.add_argument("--count", type=int, default=6)
+    parser.add_argument("--handshake-delay", type=float, default=0.0)
+    parser.add_argument("--delay", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--page-bytes", type=int, default=4096)
+    parser.add_argument("--login-fields", choices=("any", "luci", "plain"), default="any")
+    parser.add_argument("--reboot-format", choices=("any", "form", "json"), default="any")
+    parser.add_argument("--ciphers", default=None)
+    parser.add_argument("--tls-max", choices=("1.2", "1.3"), default="1.3")
+    args = parser.parse_args()
+    raise_nofile_limit(args.count * 8)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
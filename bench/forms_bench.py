@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+forms_bench.py - luci_forms vs the old BeautifulSoup token extraction
+
+Builds LuCI-sized pages (header, navigation menu, CBI form, footer
+scripts) for the pools, system and reboot screens and times, per page:
+
+  bs4    what pools_manager / NTP / reboot did: BeautifulSoup(html.parser)
+         + soup.find(...) (reboot: walk every <script>)
+  fast   luci_forms.find_token / find_script_token
+  fields cbid.* field extraction, bs4 find_all vs luci_forms.form_fields
+
+Both sides must return the same values; the run fails otherwise.
+
+    python -m bench.forms_bench --menu-items 120 --repeat 200
+"""
+
+import argparse
+import secrets
+import sys
+import time
+
+from luci_forms import find_script_token, find_token, form_fields
+from bench.fake_luci import REBOOT_PAGE, _pools_fields, _system_fields
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
+HEAD = """<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"><title>{title} - LuCI</title>
+<link rel="stylesheet" href="/luci-static/bootstrap/cascade.css">
+<script type="text/javascript" src="/luci-static/resources/cbi.js"></script>
+<script type="text/javascript" src="/luci-static/resources/xhr.js"></script>
+</head><body class="lang_en"><header><div class="fill"><div class="container">
+<a class="brand" href="#">WhatsMiner</a><ul class="nav">{menu}</ul>
+<div class="pull-right"><span id="xhr_poll_status" class="label success">Auto Refresh on</span></div>
+</div></div></header><div id="maincontent" class="container">"""
+
+MENU_ITEM = ('<li class="dropdown"><a class="menu" href="/cgi-bin/luci/admin/{i}">Menu {i}</a>'
+             '<ul class="dropdown-menu"><li><a href="/cgi-bin/luci/admin/{i}/a">Sub A</a></li>'
+             '<li><a href="/cgi-bin/luci/admin/{i}/b">Sub B</a></li></ul></li>')
+
+FORM = """<form method="post" name="cbi" action="{path}" enctype="multipart/form-data"
+ onreset="return cbi_validate_reset(this)" onsubmit="return cbi_validate_form(this, 'Some fields are invalid')">
+<div><input type="hidden" name="token" value="{token}"><input type="hidden" name="cbi.submit" value="1"></div>
+<fieldset class="cbi-section" id="cbi-{section}"><legend>{title}</legend>
+{rows}
+</fieldset>
+<div class="cbi-page-actions"><input class="cbi-button cbi-button-apply" type="submit" name="cbi.apply" value="Save &amp; Apply"></div>
+</form>"""
+
+ROW = ('<div class="cbi-value" id="cbi-row-{n}"><label class="cbi-value-title" for="row{n}">Option {n}</label>'
+       '<div class="cbi-value-field"><span class="cbi-value-helptext">Help text for option {n}</span>{field}</div></div>')
+
+FOOT = """</div><footer><a href="https://github.com/openwrt/luci">Powered by LuCI</a></footer>
+<script type="text/javascript">//<![CDATA[
+cbi_init(); var L = {{ media: '/luci-static/bootstrap', resource: '/luci-static/resources' }};
+//]]></script></body></html>"""
+
+def _page(title, body, menu_items):
+    menu = "".join(MENU_ITEM.format(i=i) for i in range(menu_items))
+    return HEAD.format(title=title, menu=menu) + body + FOOT
+
+def build_pages(menu_items):
+    token = secrets.token_hex(16)
+    pools_rows = "\n".join(ROW.format(n=i, field=f) for i, f in enumerate(_pools_fields().split("\n")))
+    system_rows = "\n".join(ROW.format(n=i, field=f) for i, f in enumerate(_system_fields().split("\n")))
+    return {
+        "pools": _page("Pools", FORM.format(path="/cgi-bin/luci/admin/network/btminer", token=token,
+                                            section="pools", title="Pools", rows=pools_rows), menu_items),
+        "system": _page("System", FORM.format(path="/cgi-bin/luci/admin/system/system", token=token,
+                                              section="system", title="System", rows=system_rows), menu_items),
+        "reboot": _page("Reboot", REBOOT_PAGE.format(token=token, sid=secrets.token_hex(16), pad=""), menu_items),
+    }
+
+# ---------------- the old code paths ----------------
+def bs4_token(html):
+    soup = BeautifulSoup(html, "html.parser")
+    token_input = soup.find("input", {"name": "token"})
+    return token_input.get("value") if token_input else None
+
+def bs4_script_token(html):
+    soup = BeautifulSoup(html, "html.parser")
+    for s in soup.find_all("script"):
+        if s.string and "token" in s.string:
+            start = s.string.find("token: '")
+            if start == -1:
+                return None
+            start += len("token: '")
+            return s.string[start:s.string.find("'", start)]
+    return None
+
+def bs4_fields(html, prefix="cbid."):
+    soup = BeautifulSoup(html, "html.parser")
+    fields = {}
+    for tag in soup.find_all(["input", "select"]):
+        name = tag.get("name", "")
+        if not name.startswith(prefix) or name in fields:
+            continue
+        if tag.name == "select":
+            option = tag.find("option", selected=True) or tag.find("option")
+            fields[name] = option.get("value", "") if option else ""
+        elif tag.get("type", "").lower() in ("checkbox", "radio") and not tag.has_attr("checked"):
+            continue
+        else:
+            fields[name] = tag.get("value", "")
+    return fields
+
+def timed(fn, html, repeat):
+    fn(html)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn(html)
+    return result, (time.perf_counter() - started) / repeat * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="LuCI token/field extraction: luci_forms vs BeautifulSoup")
+    parser.add_argument("--menu-items", type=int, default=120, help="navigation entries before the form")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    if BeautifulSoup is None:
+        print("⚠️ beautifulsoup4 is not installed; timing luci_forms only (pip install beautifulsoup4)")
+
+    cases = []
+    for page, html in build_pages(args.menu_items).items():
+        if page == "reboot":
+            cases.append((page, "token", html, bs4_script_token, find_script_token))
+        else:
+            cases.append((page, "token", html, bs4_token, find_token))
+            cases.append((page, "fields", html, bs4_fields, form_fields))
+
+    cols = ("page", "what", "kb", "bs4_us", "fast_us", "speedup")
+    print("  ".join(f"{c:>10}" for c in cols))
+    mismatch = False
+    for page, what, html, slow, fast in cases:
+        fast_result, fast_us = timed(fast, html, args.repeat)
+        row = {"page": page, "what": what, "kb": round(len(html) / 1024, 1), "fast_us": round(fast_us, 1),
+               "bs4_us": None, "speedup": None}
+        if BeautifulSoup is not None:
+            slow_result, slow_us = timed(slow, html, max(1, args.repeat // 10))
+            row.update(bs4_us=round(slow_us, 1), speedup=f"{slow_us / fast_us:.0f}x")
+            if slow_result != fast_result:
+                mismatch = True
+                print(f"❌ {page}/{what}: bs4={slow_result!r} fast={fast_result!r}")
+        print("  ".join(f"{row[c]!s:>10}" for c in cols))
+    if mismatch:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
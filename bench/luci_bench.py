@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+luci_bench.py - Control-plane benchmark against fake LuCI servers
+
+Starts bench.fake_luci with N miners, points the fleet at it and runs
+update_miner_pools, reboot_miner and super_ntp_update for every miner from
+a thread pool. Reports ops/sec per operation and per-phase latency
+(login / page_get / form_post) taken from the luci_phase_seconds metrics.
+Sessions are saved to a temporary file, never to the real luci_sessions.json.
+
+    python -m bench.luci_bench --miners 100 --handshake-delay 0.05 --delay 0.01
+"""
+
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import fleet
+import luci_session
+from discovery import raise_nofile_limit
+from metrics import LUCI_PHASE_SECONDS
+from bench.fake_luci import start_fake_luci
+
+OPERATIONS = ("pools", "reboot", "ntp")
+PHASES = ("login", "page_get", "form_post")
+POOLS = {
+    "1": {"url": "stratum+tcp://pool1.example:3333", "worker": "bench.{name}", "password": "x"},
+    "2": {"url": "stratum+tcp://pool2.example:3333", "worker": "bench.{name}", "password": "x"},
+    "3": {"url": "stratum+tcp://pool3.example:3333", "worker": "bench.{name}", "password": "x"},
+}
+
+def luci_fleet(ports):
+    return {
+        "groups": {"SIM": {"title": "Fake LuCI"}},
+        "miners": [
+            {"name": f"luci{i:04d}", "group": "SIM", "host": "127.0.0.1", "api_port": 1, "web_port": port}
+            for i, port in enumerate(ports)
+        ],
+    }
+
+def _ok(operation, result):
+    if operation == "pools":
+        return "success" in result
+    if operation == "reboot":
+        return result.get("status") == "success"
+    return bool(result.get("success"))
+
+def operation_runner(operation):
+    """name -> result dict for one control operation"""
+    if operation == "pools":
+        from pools_manager import update_miner_pools
+
+        def run(name):
+            pools = {k: dict(v, worker=v["worker"].format(name=name)) for k, v in POOLS.items()}
+            return update_miner_pools(name, pools, "admin", "admin")
+        return run
+    if operation == "reboot":
+        from reboot import reboot_miner
+        return lambda name: reboot_miner(name, "admin", "admin")
+    from NTP import super_ntp_update
+    return lambda name: super_ntp_update(name, True, ["ir.pool.ntp.org"], "Asia/Tehran", "admin", "admin")
+
+def bench_operation(operation, names, workers, rounds, verbose=False):
+    run = operation_runner(operation)
+    ok = 0
+    # the control functions print a line per step; keep the report readable
+    out = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    started = time.perf_counter()
+    with out, ThreadPoolExecutor(max_workers=workers) as pool:
+        for _ in range(rounds):
+            ok += sum(1 for r in pool.map(run, names) if _ok(operation, r))
+    elapsed = time.perf_counter() - started
+    total = len(names) * rounds
+    row = {"operation": operation, "ops": total, "ok": ok, "seconds": round(elapsed, 2),
+           "ops_per_s": round(total / elapsed, 1) if elapsed else None}
+    for phase in PHASES:
+        p50 = LUCI_PHASE_SECONDS.quantile(0.5, operation, phase)
+        p99 = LUCI_PHASE_SECONDS.quantile(0.99, operation, phase)
+        row[f"{phase}_p50_ms"] = None if p50 is None else round(p50 * 1000, 1)
+        row[f"{phase}_p99_ms"] = None if p99 is None else round(p99 * 1000, 1)
+    return row
+
+def print_table(rows):
+    cols = ["operation", "ops", "ok", "ops_per_s"] + [f"{p}_{q}_ms" for p in PHASES for q in ("p50", "p99")]
+    print("  ".join(f"{c:>16}" for c in cols))
+    for row in rows:
+        print("  ".join(f"{row[c]!s:>16}" for c in cols))
+
+def main():
+    parser = argparse.ArgumentParser(description="Pools/reboot/NTP benchmark against fake LuCI servers")
+    parser.add_argument("--miners", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=16, help="concurrent operations")
+    parser.add_argument("--rounds", type=int, default=1)
+    parser.add_argument("--ops", nargs="+", choices=OPERATIONS, default=list(OPERATIONS))
+    parser.add_argument("--handshake-delay", type=float, default=0.0)
+    parser.add_argument("--delay", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--page-bytes", type=int, default=4096)
+    parser.add_argument("--login-fields", choices=("any", "luci", "plain"), default="any",
+                        help="firmware variant: login form field names")
+    parser.add_argument("--reboot-format", choices=("any", "form", "json"), default="any",
+                        help="firmware variant: reboot call body")
+    parser.add_argument("--verbose", action="store_true", help="keep the per-miner log lines")
+    args = parser.parse_args()
+
+    raise_nofile_limit(args.miners * 8)
+    state_dir = tempfile.TemporaryDirectory(prefix="luci_bench_")
+    luci_session.SESSION_FILE = f"{state_dir.name}/luci_sessions.json"
+    proc, ports = start_fake_luci(args.miners, handshake_delay=args.handshake_delay, delay=args.delay,
+                                  jitter=args.jitter, page_bytes=args.page_bytes,
+                                  login_fields=args.login_fields, reboot_format=args.reboot_format)
+    try:
+        fleet.set_fleet(luci_fleet(ports))
+        names = fleet.miner_names()
+        rows = []
+        for operation in args.ops:
+            LUCI_PHASE_SECONDS.reset()
+            print(f"⏱️  {operation}: {len(names)} miners x {args.rounds} ...", flush=True)
+            rows.append(bench_operation(operation, names, args.workers, args.rounds, args.verbose))
+        print_table(rows)
+    finally:
+        proc.kill()
+        proc.wait()
+        fleet.set_fleet(None)
+        state_dir.cleanup()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+poll_bench.py - End-to-end poll throughput benchmark against simulated miners
+
+For every fleet size a simulator subprocess is started, the fleet registry
+is pointed at it and get_live_data() is run for a number of cycles. Reported
+per size: cycle time p50/p99, miners polled per second and per-miner
+poll_miner latency p50/p99.
+
+    python -m bench.poll_bench                      # 6, 100, 1000 miners
+    python -m bench.poll_bench --sizes 1000 --drop-rate 0.02 --save base.json
+    python -m bench.poll_bench --baseline base.json  # exit 1 on regression
+"""
+
+import argparse
+import json
+import sys
+import time
+
+import fleet
+import miner_api
+from discovery import raise_nofile_limit
+from bench.sim_miner import start_simulator
+
+DEFAULT_SIZES = (6, 100, 1000)
+# اختلاف مجاز نسبت به baseline قبل از اعلام regression
+REGRESSION_TOLERANCE = 0.25
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[idx]
+
+def sim_fleet(ports):
+    return {
+        "groups": {"SIM": {"title": "Simulated"}},
+        "miners": [
+            {"name": f"sim{i:04d}", "group": "SIM", "host": "127.0.0.1", "api_port": port, "web_port": 1}
+            for i, port in enumerate(ports)
+        ],
+    }
+
+def bench_size(main, count, cycles, warmup, sim_options):
+    proc, ports = start_simulator(count, **sim_options)
+    try:
+        fleet.set_fleet(sim_fleet(ports))
+        miners = main.build_miners()
+        latencies = []
+
+        async def timed_poll(miner):
+            started = time.perf_counter()
+            try:
+                return await main.poll_miner_async(miner)
+            finally:
+                latencies.append(time.perf_counter() - started)
+
+        # cycle time through the real entry point, per-miner latency through
+        # the same gather with a timing wrapper
+        for _ in range(warmup):
+            main.get_live_data(miners)
+        cycle_times, alive = [], 0
+        for _ in range(cycles):
+            started = time.perf_counter()
+            results = main.get_live_data(miners)
+            cycle_times.append(time.perf_counter() - started)
+            alive += sum(1 for r in results if r.get("alive"))
+        for _ in range(cycles):
+            miner_api.run(miner_api.bounded_gather(timed_poll, miners, key=lambda m: m["ip"]))
+    finally:
+        proc.kill()
+        proc.wait()
+        fleet.set_fleet(None)
+
+    total = sum(cycle_times)
+    return {
+        "miners": count,
+        "cycles": cycles,
+        "cycle_p50_ms": round(percentile(cycle_times, 50) * 1000, 2),
+        "cycle_p99_ms": round(percentile(cycle_times, 99) * 1000, 2),
+        "miners_per_s": round(count * cycles / total, 1) if total else None,
+        "poll_p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "poll_p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "alive_ratio": round(alive / float(count * cycles), 3),
+    }
+
+def print_table(rows):
+    cols = ("miners", "cycle_p50_ms", "cycle_p99_ms", "miners_per_s", "poll_p50_ms", "poll_p99_ms", "alive_ratio")
+    print("  ".join(f"{c:>13}" for c in cols))
+    for row in rows:
+        print("  ".join(f"{row[c]!s:>13}" for c in cols))
+
+def compare(rows, baseline):
+    """Return regression messages (higher latency / lower throughput than baseline)"""
+    problems = []
+    base = {r["miners"]: r for r in baseline.get("results", [])}
+    for row in rows:
+        old = base.get(row["miners"])
+        if not old:
+            continue
+        for key in ("cycle_p50_ms", "cycle_p99_ms", "poll_p99_ms"):
+            if old.get(key) and row[key] > old[key] * (1 + REGRESSION_TOLERANCE):
+                problems.append(f"{row['miners']} miners: {key} {old[key]} -> {row[key]}")
+        if old.get("miners_per_s") and row["miners_per_s"] < old["miners_per_s"] * (1 - REGRESSION_TOLERANCE):
+            problems.append(f"{row['miners']} miners: miners_per_s {old['miners_per_s']} -> {row['miners_per_s']}")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Poll throughput benchmark with simulated miners")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--cycles", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--per-host", type=int, default=None,
+                        help="per-host connection limit (default: no limit, all sims share 127.0.0.1)")
+    parser.add_argument("--latency", type=float, default=0.005)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--drop-hold", type=float, default=0.0)
+    parser.add_argument("--slow-close", type=float, default=0.0)
+    parser.add_argument("--boards", type=int, default=3)
+    parser.add_argument("--pad-bytes", type=int, default=0)
+    parser.add_argument("--no-batch", action="store_true")
+    parser.add_argument("--save", help="write results as JSON (baseline)")
+    parser.add_argument("--baseline", help="compare against a saved JSON baseline")
+    args = parser.parse_args()
+
+    raise_nofile_limit(max(args.sizes) * 4)
+    # main is imported late so the fleet override is in place before any poll
+    import main as panel
+
+    sim_options = {
+        "latency": args.latency, "jitter": args.jitter, "drop_rate": args.drop_rate,
+        "drop_hold": args.drop_hold, "slow_close": args.slow_close, "boards": args.boards,
+        "pad_bytes": args.pad_bytes, "no_batch": args.no_batch,
+    }
+    rows = []
+    for size in args.sizes:
+        miner_api.PER_HOST_CONCURRENCY = args.per_host or max(size, 1)
+        miner_api._batch_support.clear()
+        print(f"⏱️  {size} miners ...", flush=True)
+        rows.append(bench_size(panel, size, args.cycles, args.warmup, sim_options))
+    print_table(rows)
+
+    report = {"created": time.strftime("%Y-%m-%d %H:%M:%S"), "options": sim_options, "results": rows}
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 saved {args.save}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            problems = compare(rows, json.load(f))
+        for p in problems:
+            print(f"❌ regression: {p}")
+        if problems:
+            sys.exit(1)
+        print("✅ no regression against baseline")
+
+if __name__ == "__main__":
+    main()
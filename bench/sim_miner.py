@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+sim_miner.py - Simulated miners speaking the cgminer/btminer JSON API
+
+Starts N listeners on 127.0.0.1 (ephemeral ports) in one process and prints
+one JSON line {"ports": [...]} once all of them accept connections.
+
+    python -m bench.sim_miner --count 100 --latency 0.02 --drop-rate 0.05
+
+Behaviour knobs:
+  --latency/--jitter  delay before the reply (seconds)
+  --drop-rate         share of connections that get no reply at all
+  --drop-hold         how long a dropped connection stays open silently
+  --slow-close        keep the socket open this long after the reply and
+                      send no NUL terminator (btminer style)
+  --boards/--pad-bytes  response size
+  --no-batch          reject joined commands such as "summary+devs"
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+
+from discovery import raise_nofile_limit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def build_responses(boards=3, pad_bytes=0):
+    summary = {
+        "STATUS": [{"STATUS": "S", "Msg": "Summary"}],
+        "SUMMARY": [{"Elapsed": 93784, "MHS av": 104500000.0, "Power": 3250, "Temperature": 61.5}],
+    }
+    devs = {
+        "STATUS": [{"STATUS": "S", "Msg": f"{boards} ASC(s)"}],
+        "DEVS": [{"ASC": i, "Temperature": 55.0 + i * 2.5, "MHS av": 34800000.0} for i in range(boards)],
+    }
+    if pad_bytes:
+        devs["STATUS"][0]["Description"] = "x" * pad_bytes
+    version = {"STATUS": [{"STATUS": "S"}], "VERSION": [{"Type": "Antminer S19", "CGMiner": "4.11.1"}]}
+    return {"summary": summary, "devs": devs, "version": version}
+
+def reply_for(command, responses, batch=True):
+    if "+" in command:
+        if not batch:
+            return {"STATUS": [{"STATUS": "E", "Msg": "Invalid command"}]}
+        return {c: [responses.get(c, {"STATUS": [{"STATUS": "E"}]})] for c in command.split("+")}
+    return responses.get(command, {"STATUS": [{"STATUS": "E", "Msg": "Invalid command"}]})
+
+async def serve(args):
+    responses = build_responses(args.boards, args.pad_bytes)
+    # JSON is encoded once per command, not per request
+    encoded = {}
+    terminator = b"" if args.slow_close else b"\x00"
+
+    async def handle(reader, writer):
+        try:
+            data = await reader.read(4096)
+            command = json.loads(data.decode("utf-8", "ignore") or "{}").get("command", "")
+            if args.drop_rate and random.random() < args.drop_rate:
+                if args.drop_hold:
+                    await asyncio.sleep(args.drop_hold)
+                return
+            delay = args.latency + (random.uniform(-args.jitter, args.jitter) if args.jitter else 0)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            body = encoded.get(command)
+            if body is None:
+                body = encoded[command] = json.dumps(reply_for(command, responses, not args.no_batch)).encode()
+            writer.write(body + terminator)
+            await writer.drain()
+            if args.slow_close:
+                await asyncio.sleep(args.slow_close)
+        except Exception:
+            pass
+        finally:
+            writer.close()
+
+    servers = []
+    for _ in range(args.count):
+        servers.append(await asyncio.start_server(handle, "127.0.0.1", 0, backlog=1024))
+    ports = [s.sockets[0].getsockname()[1] for s in servers]
+    sys.stdout.write(json.dumps({"ports": ports}) + "\n")
+    sys.stdout.flush()
+    await asyncio.Event().wait()
+
+def spawn(module, count, **options):
+    """
+    Run a bench server module in a subprocess; returns (process, ports).
+    options use the flag names with underscores, e.g. drop_rate=0.05.
+    """
+    cmd = [sys.executable, "-m", module, "--count", str(count)]
+    for key, value in options.items():
+        flag = "--" + key.replace("_", "-")
+        if value is True:
+            cmd.append(flag)
+        elif value not in (None, False):
+            cmd += [flag, str(value)]
+    proc = subprocess.Popen(cmd, cwd=ROOT, stdout=subprocess.PIPE, text=True)
+    line = proc.stdout.readline()
+    if not line:
+        proc.kill()
+        raise RuntimeError("simulator did not start")
+    return proc, json.loads(line)["ports"]
+
+def start_simulator(count, **options):
+    """Simulated JSON-API miners in a subprocess; returns (process, ports)"""
+    return spawn("bench.sim_miner", count, **options)
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated miners on localhost")
+    parser.add_argument("--count", type=int, default=6)
+    parser.add_argument("--latency", type=float, default=0.005)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--drop-hold", type=float, default=0.0)
+    parser.add_argument("--slow-close", type=float, default=0.0)
+    parser.add_argument("--boards", type=int, default=3)
+    parser.add_argument("--pad-bytes", type=int, default=0)
+    parser.add_argument("--no-batch", action="store_true")
+    args = parser.parse_args()
+    raise_nofile_limit(args.count * 4)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
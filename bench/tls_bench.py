@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+tls_bench.py - Handshake cost per LuCI operation with and without the shared transport
+
+One operation is the old login flow plus one page: GET /cgi-bin/luci,
+POST credentials, GET an admin page. It is run against bench.fake_luci
+(use --handshake-delay to model the miners' slow TLS) in four modes:
+
+  cold       new requests.Session per operation (what the modules did)
+  full       shared adapter, connections dropped between rounds, no resumption
+  resumed    shared adapter, connections dropped between rounds, TLS resumption
+  keepalive  shared adapter, connections kept between rounds
+
+--legacy makes the servers speak TLS 1.2 with only RSA key exchange or
+SHA1 suites, like lighttpd/uhttpd on old firmware; every mode must still
+get ok == ops there.
+
+    python -m bench.tls_bench --miners 50 --rounds 5 --handshake-delay 0.05
+    python -m bench.tls_bench --legacy
+"""
+
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import fleet
+import transport
+from discovery import raise_nofile_limit
+from bench.fake_luci import start_fake_luci
+from bench.luci_bench import luci_fleet
+from bench.poll_bench import percentile
+
+MODES = ("cold", "full", "resumed", "keepalive")
+LEGACY_CIPHERS = "AES128-SHA:AES256-SHA:AES128-GCM-SHA256:ECDHE-RSA-AES128-SHA:DHE-RSA-AES256-SHA"
+
+def operation(session, base):
+    session.get(f"{base}/cgi-bin/luci", timeout=10)
+    session.post(f"{base}/cgi-bin/luci", data={"luci_username": "admin", "luci_password": "admin"},
+                 timeout=10, allow_redirects=False)
+    r = session.get(f"{base}/cgi-bin/luci/admin/system/system", timeout=10)
+    return r.status_code == 200
+
+def cold_session():
+    session = requests.Session()
+    session.verify = False
+    session.trust_env = False
+    return session
+
+def handshakes():
+    return transport.TLS_HANDSHAKES.value("full"), transport.TLS_HANDSHAKES.value("resumed")
+
+def bench_mode(mode, bases, rounds, workers):
+    adapter = None
+    if mode != "cold":
+        ctx = transport.make_ssl_context(resume=(mode != "full"))
+        adapter = transport.MinerAdapter(ctx, pool_connections=len(bases), pool_maxsize=2, max_retries=0)
+    latencies, ok = [], 0
+    full0, resumed0 = handshakes()
+
+    def one(base):
+        session = cold_session() if adapter is None else transport.new_session(adapter)
+        started = time.perf_counter()
+        try:
+            return operation(session, base)
+        except requests.RequestException as e:
+            print(f"❌ {mode} {base}: {e}")
+            return False
+        finally:
+            latencies.append(time.perf_counter() - started)
+            if adapter is None:
+                session.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for _ in range(rounds):
+            ok += sum(1 for r in pool.map(one, bases) if r)
+            if mode in ("full", "resumed"):
+                # miners drop idle keep-alive connections; every round reconnects
+                adapter.poolmanager.clear()
+    elapsed = time.perf_counter() - started
+    full1, resumed1 = handshakes()
+    ops = len(bases) * rounds
+    return {
+        "mode": mode,
+        "ops": ops,
+        "ok": ok,
+        "ops_per_s": round(ops / elapsed, 1),
+        "op_p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "op_p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        # cold sessions use requests' own SSLContext, which is not instrumented
+        "full_hs": None if mode == "cold" else full1 - full0,
+        "resumed_hs": None if mode == "cold" else resumed1 - resumed0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="TLS keep-alive / resumption benchmark against fake LuCI")
+    parser.add_argument("--miners", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--handshake-delay", type=float, default=0.05)
+    parser.add_argument("--delay", type=float, default=0.0)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--tls-max", choices=("1.2", "1.3"), default="1.3")
+    parser.add_argument("--server-ciphers", default=None, help="OpenSSL cipher string the servers offer")
+    parser.add_argument("--legacy", action="store_true", help=f"TLS 1.2 with {LEGACY_CIPHERS} only")
+    args = parser.parse_args()
+    if args.legacy:
+        args.tls_max, args.server_ciphers = "1.2", args.server_ciphers or LEGACY_CIPHERS
+
+    raise_nofile_limit(args.miners * 8)
+    requests.packages.urllib3.disable_warnings()
+    proc, ports = start_fake_luci(args.miners, handshake_delay=args.handshake_delay, delay=args.delay,
+                                  tls_max=args.tls_max, ciphers=args.server_ciphers)
+    try:
+        fleet.set_fleet(luci_fleet(ports))
+        bases = [f"https://127.0.0.1:{p}" for p in ports]
+        rows = [bench_mode(mode, bases, args.rounds, args.workers) for mode in args.modes]
+    finally:
+        proc.kill()
+        proc.wait()
+        fleet.set_fleet(None)
+
+    cold = next((r for r in rows if r["mode"] == "cold"), None)
+    cols = ("mode", "ops", "ok", "ops_per_s", "op_p50_ms", "op_p99_ms", "full_hs", "resumed_hs", "saved_ms_per_op")
+    print("  ".join(f"{c:>15}" for c in cols))
+    for row in rows:
+        row["saved_ms_per_op"] = round(cold["op_p50_ms"] - row["op_p50_ms"], 1) if cold else None
+        print("  ".join(f"{row[c]!s:>15}" for c in cols))
+    if any(row["ok"] < row["ops"] for row in rows):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+bulk.py - Run one control operation on many miners on the server
+
+dispatch() runs fn(miner) over a bounded thread pool, at most PER_HOST at
+a time behind one host (site / NAT), and reports one event per finished
+miner. It blocks the calling thread, which is a jobs.py worker for the
+control routes, so the job pool bounds the bulk runs too; a closed
+browser tab does not stop them.
+"""
+
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from fleet import get_miner
+
+# تعداد عملیات هم‌زمان روی ماینرها
+WORKERS = int(os.environ.get("BULK_WORKERS", 16))
+PER_HOST = int(os.environ.get("BULK_PER_HOST", 8))
+
+def is_success(result):
+    """pools: {"success": msg}, reboot: {"status": "success"}, NTP: {"success": True}"""
+    if not isinstance(result, dict):
+        return False
+    return bool(result.get("success")) or result.get("status") == "success"
+
+def _run_one(fn, name):
+    started = time.perf_counter()
+    try:
+        result = fn(name)
+    except Exception as e:
+        result = {"error": str(e)}
+    return result, round(time.perf_counter() - started, 3)
+
+def dispatch(names, fn, emit, workers=None, per_host=None):
+    """
+    Run fn(name) for every miner and return the summary.
+
+    emit gets one dict per miner ({"miner", "ok", "result", "seconds",
+    "done", "total"}) from the calling thread as the miners finish.
+    """
+    names = [str(n) for n in dict.fromkeys(names)]
+    workers = workers or WORKERS
+    per_host = per_host or PER_HOST
+    total = len(names)
+    pending = {}      # host -> deque of names
+    in_flight = {}    # host -> running count
+    done = ok = 0
+    started = time.perf_counter()
+    for name in names:
+        miner = get_miner(name)
+        if miner is None:
+            done += 1
+            emit({"miner": name, "ok": False, "result": {"error": f"Miner {name} not found in fleet"},
+                  "seconds": 0, "done": done, "total": total})
+            continue
+        pending.setdefault(miner["host"], deque()).append(name)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        running = {}
+        while pending or running:
+            # round-robin over hosts so one big site does not starve the others
+            for host in list(pending):
+                while (pending[host] and len(running) < workers
+                       and in_flight.get(host, 0) < per_host):
+                    name = pending[host].popleft()
+                    in_flight[host] = in_flight.get(host, 0) + 1
+                    running[pool.submit(_run_one, fn, name)] = (host, name)
+                if not pending[host]:
+                    del pending[host]
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                host, name = running.pop(future)
+                in_flight[host] -= 1
+                result, seconds = future.result()
+                done += 1
+                success = is_success(result)
+                ok += success
+                emit({"miner": name, "ok": success, "result": result,
+                      "seconds": seconds, "done": done, "total": total})
+    return {"total": total, "ok": ok, "failed": total - ok,
+            "seconds": round(time.perf_counter() - started, 3)}
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+discovery.py - Scan subnets for miners and write the fleet config
+
+Every address of the given CIDR ranges is probed with {"command":"version"}
+on the miner API port; hosts that answer are checked for the LuCI login page
+and the result is merged into fleet.json (existing entries keep their names,
+groups and colors).
+
+    python discovery.py 10.20.0.0/16 10.21.4.0/24 --group C
+
+Probes run on one event loop with a short connect timeout, so thousands of
+them are in flight at once.
+"""
+
+import argparse
+import asyncio
+import ipaddress
+import json
+import os
+import ssl
+import time
+
+from fleet import FLEET_CONFIG, build_fleet
+from miner_api import API_PORT, query
+
+CONNECT_TIMEOUT = 0.5
+PROBE_TIMEOUT = 2.0
+HTTPS_PORT = 443
+# تعداد probe همزمان (هر کدام یک سوکت)
+SCAN_CONCURRENCY = int(os.environ.get("DISCOVERY_CONCURRENCY", 4096))
+GROUP_COLORS = ["#3B82F6", "#10B981", "#8B5CF6", "#F59E0B", "#EF4444", "#EC4899", "#14B8A6", "#6366F1"]
+
+def raise_nofile_limit(wanted):
+    """Allow enough sockets for the scan (soft limit up to the hard limit)"""
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        target = wanted + 256 if hard == resource.RLIM_INFINITY else min(hard, wanted + 256)
+        if soft < target:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+            soft = target
+        return soft
+    except (ImportError, ValueError, OSError):
+        return None
+
+def parse_version(resp):
+    """model / firmware from a cgminer or btminer "version" reply"""
+    info = {}
+    if not isinstance(resp, dict):
+        return info
+    entry = resp.get("VERSION")
+    if isinstance(entry, list) and entry:
+        entry = entry[0]
+    if not isinstance(entry, dict):
+        entry = resp.get("Msg") if isinstance(resp.get("Msg"), dict) else {}
+    model = entry.get("Type") or entry.get("Model") or entry.get("model")
+    firmware = (entry.get("fw_ver") or entry.get("Firmware") or entry.get("CompileTime")
+                or entry.get("BMMiner") or entry.get("CGMiner") or entry.get("BTMiner"))
+    if model:
+        info["model"] = str(model).strip()
+    if firmware:
+        info["firmware"] = str(firmware).strip()
+    return info
+
+_TLS = ssl.create_default_context()
+_TLS.check_hostname = False
+_TLS.verify_mode = ssl.CERT_NONE
+
+async def probe_luci(host, port=HTTPS_PORT, timeout=PROBE_TIMEOUT):
+    """True when https://host:port/cgi-bin/luci serves a LuCI page"""
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=_TLS, server_hostname=None), timeout)
+        writer.write(f"GET /cgi-bin/luci HTTP/1.0\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        head = await asyncio.wait_for(reader.read(8192), timeout)
+        text = head.decode("latin-1").lower()
+        if not text.startswith("http/"):
+            return False
+        status = text.split(None, 2)[1] if len(text.split(None, 2)) > 1 else ""
+        return status in ("200", "302", "403") and ("luci" in text or "username" in text)
+    except Exception:
+        return False
+    finally:
+        if writer is not None:
+            writer.close()
+
+async def probe_host(host, api_port=API_PORT, web_port=HTTPS_PORT,
+                     connect_timeout=CONNECT_TIMEOUT, timeout=PROBE_TIMEOUT):
+    """Probe one address; returns a fleet entry dict or None"""
+    resp = await query(host, api_port, {"command": "version"}, timeout, connect_timeout=connect_timeout)
+    if resp is None:
+        return None
+    found = {"host": host, "api_port": api_port, "web_port": web_port}
+    found.update(parse_version(resp))
+    found["luci"] = await probe_luci(host, web_port, timeout)
+    return found
+
+async def scan(networks, api_port=API_PORT, web_port=HTTPS_PORT, concurrency=SCAN_CONCURRENCY,
+               connect_timeout=CONNECT_TIMEOUT, timeout=PROBE_TIMEOUT, progress=None):
+    """
+    Probe every host address of the given networks.
+
+    A fixed pool of worker coroutines pulls addresses from a shared
+    iterator, so a /16 never materializes 65k tasks at once.
+    """
+    addresses = (str(ip) for net in networks for ip in ipaddress.ip_network(net, strict=False).hosts())
+    total = sum(max(ipaddress.ip_network(n, strict=False).num_addresses - 2, 1) for n in networks)
+    found = []
+    done = [0]
+
+    async def worker():
+        for host in addresses:
+            result = await probe_host(host, api_port, web_port, connect_timeout, timeout)
+            done[0] += 1
+            if result:
+                found.append(result)
+            if progress and done[0] % 1024 == 0:
+                progress(done[0], total, len(found))
+
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, total)))))
+    found.sort(key=lambda r: ipaddress.ip_address(r["host"]))
+    return found
+
+def _new_name(host, taken):
+    parts = host.replace(":", ".").split(".")
+    for n in (1, 2, len(parts)):
+        name = "-".join(parts[-n:])
+        if name not in taken:
+            return name
+    return host
+
+def merge_fleet(data, found, group="discovered"):
+    """Add discovered miners to fleet config data (existing entries win)"""
+    data = {"groups": dict(data.get("groups") or {}), "miners": [dict(m) for m in data.get("miners") or []]}
+    current = build_fleet(data)
+    taken = set(current["by_name"])
+    added = 0
+    for item in found:
+        known = current["by_address"].get((item["host"], item["api_port"]))
+        if known:
+            # ماینر موجود: فقط مدل و فریمور به‌روز می‌شود
+            for entry in data["miners"]:
+                if str(entry["name"]) == known["name"]:
+                    entry.update({k: item[k] for k in ("model", "firmware") if k in item})
+            continue
+        name = _new_name(item["host"], taken)
+        taken.add(name)
+        entry = {
+            "name": name,
+            "group": group,
+            "host": item["host"],
+            "api_port": item["api_port"],
+            "web_port": item["web_port"],
+            "label": name,
+            "color": GROUP_COLORS[added % len(GROUP_COLORS)],
+        }
+        entry.update({k: item[k] for k in ("model", "firmware") if k in item})
+        if not item.get("luci"):
+            entry["luci"] = False
+        data["miners"].append(entry)
+        added += 1
+    if added:
+        data["groups"].setdefault(group, {"title": f"Group {group}"})
+    return data, added
+
+def write_fleet(data, path=FLEET_CONFIG):
+    """Atomic write so the hot reload in fleet.py never sees half a file"""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    os.replace(tmp, path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Discover miners and write the fleet config")
+    parser.add_argument("networks", nargs="+", help="CIDR ranges, e.g. 10.20.0.0/16")
+    parser.add_argument("--api-port", type=int, default=API_PORT)
+    parser.add_argument("--web-port", type=int, default=HTTPS_PORT)
+    parser.add_argument("--group", default="discovered", help="group for newly found miners")
+    parser.add_argument("--concurrency", type=int, default=SCAN_CONCURRENCY)
+    parser.add_argument("--connect-timeout", type=float, default=CONNECT_TIMEOUT)
+    parser.add_argument("--timeout", type=float, default=PROBE_TIMEOUT)
+    parser.add_argument("--out", default=FLEET_CONFIG, help="fleet config to update")
+    parser.add_argument("--dry-run", action="store_true", help="print results, do not write")
+    args = parser.parse_args()
+
+    limit = raise_nofile_limit(args.concurrency)
+    concurrency = args.concurrency if limit is None else max(1, min(args.concurrency, limit - 256))
+
+    def progress(done, total, hits):
+        print(f"🔎 {done}/{total} probed, {hits} miners")
+
+    started = time.time()
+    found = asyncio.run(scan(args.networks, args.api_port, args.web_port, concurrency,
+                             args.connect_timeout, args.timeout, progress))
+    print(f"✅ Scan finished in {time.time() - started:.1f}s: {len(found)} miners")
+    for item in found:
+        print(f"   {item['host']}:{item['api_port']}  {item.get('model', '?')}  {item.get('firmware', '?')}"
+              f"  luci={'yes' if item['luci'] else 'no'}")
+    if args.dry_run:
+        return
+
+    try:
+        with open(args.out, encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        data = {}
+    data, added = merge_fleet(data, found, args.group)
+    write_fleet(data, args.out)
+    print(f"💾 {args.out}: {added} new miners, {len(data['miners'])} total")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+fleet.py - Single miner registry loaded from a config file (fleet.json)
+
+Every module looks miners up here instead of keeping its own port map.
+The file is re-read automatically when it changes on disk.
+
+Each miner has its own host, API port and web port. A group may set a
+"host" for all of its miners (one site behind one gateway); MINER_IP is
+only the fallback for entries that have neither.
+"""
+
+import json
+import os
+import threading
+import time
+
+FLEET_CONFIG = os.environ.get("FLEET_CONFIG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "fleet.json"))
+# میزبان پیش‌فرض برای ماینرهایی که host ندارند
+DEFAULT_HOST = os.environ.get("MINER_IP")
+RELOAD_CHECK_SECONDS = 2.0
+
+_lock = threading.Lock()
+_fleet = None
+_mtime = None
+_last_check = 0.0
+
+def build_fleet(data, version=1):
+    """Normalize config data and build the lookup indexes"""
+    groups, group_hosts = {}, {}
+    for key, info in (data.get("groups") or {}).items():
+        info = info if isinstance(info, dict) else {"title": str(info)}
+        groups[str(key)] = info.get("title") or f"Group {key}"
+        if info.get("host"):
+            group_hosts[str(key)] = info["host"]
+    miners = []
+    by_name, by_group, by_host, by_port, by_web_port, by_address = {}, {}, {}, {}, {}, {}
+    for entry in data.get("miners") or []:
+        name = str(entry["name"])
+        if name in by_name:
+            raise ValueError(f"Duplicate miner name {name}")
+        group = str(entry.get("group") or "default")
+        miner = {
+            "name": name,
+            "host": entry.get("host") or group_hosts.get(group) or DEFAULT_HOST,
+            "api_port": int(entry["api_port"]),
+            "web_port": int(entry["web_port"]),
+            "group": group,
+            "label": entry.get("label") or name,
+            "color": entry.get("color") or "#666",
+        }
+        for key in ("model", "firmware"):
+            if entry.get(key):
+                miner[key] = entry[key]
+        miners.append(miner)
+        by_name[name] = miner
+        by_group.setdefault(group, []).append(miner)
+        by_host.setdefault(miner["host"], []).append(miner)
+        by_port.setdefault(miner["api_port"], miner)
+        by_web_port.setdefault(miner["web_port"], miner)
+        by_address[(miner["host"], miner["api_port"])] = miner
+        groups.setdefault(group, f"Group {group}")
+    return {
+        "version": version,
+        "groups": groups,
+        "miners": miners,
+        "by_name": by_name,
+        "by_group": by_group,
+        "by_host": by_host,
+        "by_port": by_port,
+        "by_web_port": by_web_port,
+        "by_address": by_address,
+    }
+
+def _load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def get_fleet():
+    """Current registry; re-reads FLEET_CONFIG when its mtime changes"""
+    global _fleet, _mtime, _last_check
+    now = time.monotonic()
+    if _fleet is not None and now - _last_check < RELOAD_CHECK_SECONDS:
+        return _fleet
+    with _lock:
+        if _fleet is not None and now - _last_check < RELOAD_CHECK_SECONDS:
+            return _fleet
+        _last_check = now
+        try:
+            mtime = os.stat(FLEET_CONFIG).st_mtime
+        except OSError as e:
+            if _fleet is None:
+                print(f"❌ Fleet config not readable: {e}")
+                _fleet = build_fleet({}, version=1)
+            return _fleet
+        if mtime != _mtime:
+            try:
+                version = (_fleet["version"] + 1) if _fleet else 1
+                _fleet = build_fleet(_load(FLEET_CONFIG), version)
+                _mtime = mtime
+                print(f"✅ Fleet loaded: {len(_fleet['miners'])} miners (v{version})")
+            except Exception as e:
+                # keep serving the previous registry if the new file is broken
+                print(f"❌ Fleet config error: {e}")
+                if _fleet is None:
+                    _fleet = build_fleet({}, version=1)
+        return _fleet
+
+def set_fleet(data):
+    """
+    Replace the registry with in-memory config data (benchmarks, tools).
+    The config file is no longer watched until set_fleet(None).
+    """
+    global _fleet, _mtime, _last_check
+    with _lock:
+        if data is None:
+            # next get_fleet() re-reads FLEET_CONFIG
+            _mtime = None
+            _last_check = float("-inf")
+            return None
+        version = (_fleet["version"] + 1) if _fleet else 1
+        _fleet = build_fleet(data, version)
+        _mtime = "override"
+        _last_check = float("inf")
+        return _fleet
+
+# ---------------- lookups ----------------
+def get_miner(name):
+    return get_fleet()["by_name"].get(str(name))
+
+def miner_names():
+    return [m["name"] for m in get_fleet()["miners"]]
+
+def find_miner(text):
+    """Resolve user input such as "131", "131 (204)" or a port number"""
+    if not text:
+        return None
+    fleet = get_fleet()
+    text = str(text).strip()
+    key = text.split()[0] if text else text
+    miner = fleet["by_name"].get(text) or fleet["by_name"].get(key)
+    if miner is None and key.isdigit():
+        miner = fleet["by_port"].get(int(key)) or fleet["by_web_port"].get(int(key))
+    return miner
+
+def miners_by_host(names=None):
+    """{host: [miner, ...]} for the given names (default: whole fleet)"""
+    fleet = get_fleet()
+    if names is None:
+        return dict(fleet["by_host"])
+    out = {}
+    for name in names:
+        miner = fleet["by_name"].get(str(name))
+        if miner:
+            out.setdefault(miner["host"], []).append(miner)
+    return out
+
+def web_url(miner):
+    """Base URL of the miner's LuCI web interface"""
+    if isinstance(miner, str):
+        miner = get_miner(miner)
+    if not miner or not miner.get("host"):
+        return None
+    host = miner["host"]
+    if ":" in host and not host.startswith("["):
+        host = f"[{host}]"  # IPv6
+    return f"https://{host}:{miner['web_port']}"
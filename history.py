@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+history.py - In-memory ring-buffer history of hashrate, power and board temps
+
+Samples are folded into fixed time buckets (BUCKET_SECONDS) kept in a ring
+sized for the longest window, so memory per miner is fixed. Every window
+keeps a running sum/count and monotonic min/max queues, which makes
+avg/min/max queries O(1).
+"""
+
+import math
+import threading
+import time
+from array import array
+from collections import deque
+
+BUCKET_SECONDS = 60
+WINDOWS = {"15m": 15 * 60, "1h": 60 * 60, "24h": 24 * 60 * 60}
+METRICS = ("hashrate", "power", "board_temp")
+
+class _Window:
+    __slots__ = ("buckets", "tail", "total", "count", "minq", "maxq")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.tail = 0          # oldest bucket number still inside the window
+        self.total = 0.0
+        self.count = 0
+        self.minq = deque()    # (bucket, value), values increasing
+        self.maxq = deque()    # (bucket, value), values decreasing
+
+class RingSeries:
+    """Fixed-size bucketed time series with O(1) sliding-window stats"""
+
+    def __init__(self, windows=WINDOWS, bucket_seconds=BUCKET_SECONDS):
+        self.bucket_seconds = bucket_seconds
+        self.size = max(1, max(windows.values()) // bucket_seconds)
+        self.stamps = array("l", [-1]) * self.size
+        self.sums = array("d", [0.0]) * self.size
+        self.counts = array("H", [0]) * self.size
+        self.head = -1
+        self.windows = {name: _Window(max(1, sec // bucket_seconds)) for name, sec in windows.items()}
+
+    def _advance(self, bucket):
+        if bucket <= self.head:
+            return
+        if self.head < 0 or bucket - self.head >= self.size:
+            # first sample or silent for longer than the ring: start over
+            for i in range(self.size):
+                self.stamps[i] = -1
+            for w in self.windows.values():
+                w.tail, w.total, w.count = bucket - w.buckets + 1, 0.0, 0
+                w.minq.clear()
+                w.maxq.clear()
+        else:
+            for w in self.windows.values():
+                new_tail = bucket - w.buckets + 1
+                for k in range(w.tail, new_tail):
+                    idx = k % self.size
+                    if self.stamps[idx] == k:
+                        w.total -= self.sums[idx]
+                        w.count -= self.counts[idx]
+                w.tail = max(w.tail, new_tail)
+                if w.count <= 0:
+                    w.total, w.count = 0.0, 0
+                while w.minq and w.minq[0][0] < w.tail:
+                    w.minq.popleft()
+                while w.maxq and w.maxq[0][0] < w.tail:
+                    w.maxq.popleft()
+        idx = bucket % self.size
+        self.stamps[idx] = bucket
+        self.sums[idx] = 0.0
+        self.counts[idx] = 0
+        self.head = bucket
+
+    def add(self, ts, value):
+        bucket = int(ts // self.bucket_seconds)
+        if bucket < self.head:
+            return
+        self._advance(bucket)
+        idx = bucket % self.size
+        self.sums[idx] += value
+        if self.counts[idx] < 0xFFFF:
+            self.counts[idx] += 1
+        for w in self.windows.values():
+            w.total += value
+            w.count += 1
+            minq, maxq = w.minq, w.maxq
+            while minq and minq[-1][1] >= value:
+                minq.pop()
+            if not (minq and minq[-1][0] == bucket):
+                minq.append((bucket, value))
+            while maxq and maxq[-1][1] <= value:
+                maxq.pop()
+            if not (maxq and maxq[-1][0] == bucket):
+                maxq.append((bucket, value))
+
+    def stats(self, now=None):
+        """{window: {"avg", "min", "max", "count"}} as of `now`"""
+        now = time.time() if now is None else now
+        self._advance(int(now // self.bucket_seconds))
+        out = {}
+        for name, w in self.windows.items():
+            if not w.count:
+                out[name] = {"avg": None, "min": None, "max": None, "count": 0}
+                continue
+            out[name] = {
+                "avg": round(w.total / w.count, 2),
+                "min": w.minq[0][1] if w.minq else None,
+                "max": w.maxq[0][1] if w.maxq else None,
+                "count": w.count,
+            }
+        return out
+
+# ---------------- fleet history ----------------
+_lock = threading.Lock()
+_series = {}  # miner -> {metric: RingSeries}
+
+def _metric_values(miner):
+    temps = miner.get("board_temps") or []
+    return {
+        "hashrate": miner.get("hashrate"),
+        "power": miner.get("power"),
+        "board_temp": max(temps) if temps else None,
+    }
+
+def record(miner, ts=None):
+    """Fold one poll result into the miner's ring buffers"""
+    if not miner.get("alive"):
+        return
+    ts = time.time() if ts is None else ts
+    name = miner.get("miner")
+    with _lock:
+        series = _series.get(name)
+        if series is None:
+            series = _series[name] = {metric: RingSeries() for metric in METRICS}
+        for metric, value in _metric_values(miner).items():
+            if value is not None and not (isinstance(value, float) and math.isnan(value)):
+                series[metric].add(ts, float(value))
+
+def record_snapshot(snapshot):
+    """Poller listener: record every miner of a fresh snapshot"""
+    ts = snapshot.get("updated_at") or time.time()
+    for miner in snapshot.get("miners", []):
+        record(miner, ts)
+
+def get_history(miner_name, now=None):
+    """Window stats for every metric of one miner, or None if unknown"""
+    with _lock:
+        series = _series.get(miner_name)
+        if series is None:
+            return None
+        return {metric: s.stats(now) for metric, s in series.items()}
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+jobs.py - Background jobs for long-running miner operations
+
+Control routes submit() their work and answer right away with the job id;
+a bounded pool of JOB_WORKERS threads runs the jobs. Long jobs (bulk runs,
+rolling reboots that wait for every wave) get their own LONG_JOB_WORKERS
+pool, so single-miner jobs never queue behind them. Every job keeps its
+progress events, so /jobs/<id>/events (SSE) can be opened at any time,
+replays what already happened and then follows the job live. A closed
+browser only drops its subscription, never the job.
+"""
+
+import itertools
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from live_stream import HEARTBEAT_SECONDS, format_event
+
+# تعداد job هم‌زمان و تعداد job تمام‌شده‌ای که نگه داشته می‌شود
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 8))
+LONG_JOB_WORKERS = int(os.environ.get("LONG_JOB_WORKERS", 2))
+JOBS_KEEP = int(os.environ.get("JOBS_KEEP", 200))
+SUBSCRIBER_QUEUE = 1024
+
+_lock = threading.Lock()
+_jobs = {}           # id -> job dict (insertion order = submit order)
+_subscribers = {}    # id -> set of queues
+_ids = itertools.count(1)
+_pools = {}         # "short" / "long" -> ThreadPoolExecutor
+
+def _executor(long=False):
+    name = "long" if long else "short"
+    with _lock:
+        if name not in _pools:
+            _pools[name] = ThreadPoolExecutor(
+                max_workers=LONG_JOB_WORKERS if long else JOB_WORKERS, thread_name_prefix=f"job-{name}")
+        return _pools[name]
+
+def public(job, events=False):
+    """JSON-safe copy of a job (events only when asked for)"""
+    out = {k: v for k, v in job.items() if k != "events"}
+    out["event_count"] = len(job["events"])
+    if events:
+        out["events"] = list(job["events"])
+    return out
+
+def _publish(job_id, message):
+    for q in list(_subscribers.get(job_id, ())):
+        try:
+            q.put_nowait(message)
+        except queue.Full:
+            # the client is not reading; it resumes from Last-Event-ID
+            _subscribers[job_id].discard(q)
+            with q.mutex:
+                q.queue.clear()
+            q.put_nowait(None)
+
+def _emit(job_id, event):
+    with _lock:
+        job = _jobs[job_id]
+        job["events"].append(event)
+        if "done" in event and "total" in event:
+            job["progress"] = {"done": event["done"], "total": event["total"]}
+        message = f"id: {len(job['events'])}\n" + format_event("progress", event)
+        _publish(job_id, message)
+
+def _finish(job_id, state, result=None, error=None):
+    with _lock:
+        job = _jobs[job_id]
+        job.update(state=state, finished=time.time(), result=result, error=error)
+        _publish(job_id, format_event("done", public(job)))
+        _subscribers.pop(job_id, None)
+        _trim()
+
+def _trim():
+    finished = [j for j in _jobs.values() if j["state"] in ("done", "failed")]
+    for job in finished[:max(0, len(finished) - JOBS_KEEP)]:
+        del _jobs[job["id"]]
+
+def _run(job_id, fn, check):
+    with _lock:
+        job = _jobs[job_id]
+        job.update(state="running", started=time.time())
+        print(f"▶️ Job {job_id} ({job['kind']}) started")
+    try:
+        result = fn(lambda event: _emit(job_id, event))
+    except Exception as e:
+        print(f"❌ Job {job_id} failed: {e}")
+        _finish(job_id, "failed", error=str(e))
+        return
+    if check is not None and not check(result):
+        error = result.get("error") or result.get("message") if isinstance(result, dict) else None
+        print(f"❌ Job {job_id} failed: {error}")
+        _finish(job_id, "failed", result=result, error=error or "Operation failed")
+        return
+    print(f"✅ Job {job_id} finished")
+    _finish(job_id, "done", result=result)
+
+def submit(kind, fn, miners=None, params=None, check=None, long=False):
+    """
+    Queue fn(emit) as a job and return its public dict.
+
+    fn reports progress with emit(event_dict); its return value becomes
+    job["result"], an exception marks the job failed. check, when given,
+    is called with the result; a false answer marks the job failed too.
+    long=True runs the job on the LONG_JOB_WORKERS pool.
+    """
+    with _lock:
+        job_id = f"{int(time.time()):x}-{next(_ids)}"
+        job = _jobs[job_id] = {
+            "id": job_id, "kind": kind, "state": "queued",
+            "miners": [str(m) for m in miners or []], "params": params or {},
+            "created": time.time(), "started": None, "finished": None,
+            "progress": {"done": 0, "total": len(miners or [])},
+            "result": None, "error": None, "events": [],
+        }
+        snapshot = public(job)
+    _executor(long).submit(_run, job_id, fn, check)
+    return snapshot
+
+def get_job(job_id, events=False):
+    with _lock:
+        job = _jobs.get(job_id)
+        return public(job, events) if job else None
+
+def active_jobs(kind):
+    """Queued or running jobs of one kind"""
+    with _lock:
+        return [public(j) for j in _jobs.values() if j["kind"] == kind and j["state"] in ("queued", "running")]
+
+def list_jobs(state=None):
+    """Newest first"""
+    with _lock:
+        jobs = [public(j) for j in reversed(_jobs.values()) if state is None or j["state"] == state]
+    return jobs
+
+def stream(job_id, last_event_id=0):
+    """SSE frames for one job: stored events after last_event_id, then live ones, then "done" """
+    q = queue.Queue(SUBSCRIBER_QUEUE)
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return
+        backlog = [f"id: {index}\n" + format_event("progress", event)
+                   for index, event in enumerate(job["events"][last_event_id:], start=last_event_id + 1)]
+        finished = job["state"] in ("done", "failed")
+        if finished:
+            backlog.append(format_event("done", public(job)))
+        else:
+            _subscribers.setdefault(job_id, set()).add(q)
+    try:
+        yield "retry: 3000\n\n"
+        yield from backlog
+        while not finished:
+            try:
+                message = q.get(timeout=HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield ": ping\n\n"
+                continue
+            if message is None:
+                return
+            yield message
+            if message.startswith("event: done"):
+                return
+    finally:
+        with _lock:
+            subs = _subscribers.get(job_id)
+            if subs is not None:
+                subs.discard(q)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+live_stream.py - Server-Sent Events feed of per-miner telemetry deltas
+
+The poller calls publish_deltas() after every refresh; only miners whose
+watched fields changed are pushed to the connected dashboards.
+"""
+
+import json
+import queue
+import threading
+
+# فیلدهایی که تغییرشان به مرورگر فرستاده می‌شود
+FIELDS = ("alive", "hashrate", "board_temps", "power", "uptime")
+# display classes travel with the values so the browser does not recompute them
+DISPLAY_FIELDS = ("uptime_class", "hashrate_class", "temp_cells")
+HEARTBEAT_SECONDS = 15
+SUBSCRIBER_QUEUE = 32
+
+_lock = threading.Lock()
+_subscribers = set()
+_last = {}          # miner -> {field: value}
+_last_total = None
+
+def _fields(miner):
+    return {f: miner.get(f) for f in FIELDS + DISPLAY_FIELDS}
+
+def _total(miners):
+    return round(sum(m["hashrate"] for m in miners if m.get("alive") and m.get("hashrate") is not None), 2)
+
+def _full_state():
+    return {"miners": dict(_last), "total_hashrate": _last_total}
+
+def format_event(event, data):
+    payload = json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+def publish_deltas(snapshot):
+    """Poller listener: push changed miners to every subscriber"""
+    global _last_total
+    changed = {}
+    miners = snapshot.get("miners", [])
+    with _lock:
+        for m in miners:
+            name = m.get("miner")
+            fields = _fields(m)
+            if _last.get(name) != fields:
+                _last[name] = fields
+                changed[name] = fields
+        # miners dropped from fleet.json
+        current = {m.get("miner") for m in miners}
+        removed = [name for name in _last if name not in current]
+        for name in removed:
+            del _last[name]
+        total = _total(miners)
+        total_changed = total != _last_total
+        _last_total = total
+        if not changed and not removed and not total_changed:
+            return
+        message = format_event("delta", {
+            "version": snapshot.get("version"),
+            "miners": changed,
+            "removed": removed,
+            "total_hashrate": total,
+        })
+        for q in list(_subscribers):
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                # too slow to keep up: drop it, the browser reconnects and resyncs
+                _subscribers.discard(q)
+                with q.mutex:
+                    q.queue.clear()
+                q.put_nowait(None)
+
+def subscribe():
+    q = queue.Queue(SUBSCRIBER_QUEUE)
+    with _lock:
+        q.put_nowait(format_event("snapshot", _full_state()))
+        _subscribers.add(q)
+    return q
+
+def unsubscribe(q):
+    with _lock:
+        _subscribers.discard(q)
+
+def stream():
+    """Generator of SSE frames for one client"""
+    q = subscribe()
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                message = q.get(timeout=HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield ": ping\n\n"
+                continue
+            if message is None:
+                return
+            yield message
+    finally:
+        unsubscribe(q)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+luci_forms.py - Token and form field extraction from LuCI pages
+
+The control flows only need the CSRF token and the cbid.* fields of a LuCI
+page, so instead of building a BeautifulSoup tree of the whole page these
+helpers scan the tags with regular expressions. find_token() stops at the
+first <input name="token">; form_fields() walks the <input>/<select>/
+<textarea> tags once. Compare with: python -m bench.forms_bench
+"""
+
+import re
+from html import unescape
+
+_INPUT = re.compile(r"<input\b[^>]*>", re.I)
+_FIELD = re.compile(
+    r"<(input)\b([^>]*)>"
+    r"|<(select)\b([^>]*)>(.*?)</select\s*>"
+    r"|<(textarea)\b([^>]*)>(.*?)</textarea\s*>",
+    re.I | re.S,
+)
+_OPTION = re.compile(r"<option\b([^>]*)>", re.I)
+_ATTR = re.compile(r"""([^\s=/>"']+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+)))?""")
+_SCRIPT_TOKEN = "token: '"
+
+def attrs(tag_body):
+    """{name: value} of the attributes in the inside of a tag (names lower-cased)"""
+    out = {}
+    for m in _ATTR.finditer(tag_body):
+        name = m.group(1).lower()
+        if name in out:
+            continue  # like the browser: the first one wins
+        value = m.group(2) if m.group(2) is not None else m.group(3) if m.group(3) is not None else m.group(4)
+        out[name] = unescape(value) if value else ""
+    return out
+
+def find_token(html, name="token"):
+    """value of the first <input name="token">, or None"""
+    for m in _INPUT.finditer(html):
+        tag = m.group(0)
+        # cheap test first; only a likely tag gets its attributes parsed
+        if name not in tag:
+            continue
+        a = attrs(tag[6:-1])
+        if a.get("name") == name:
+            return a.get("value", "")
+    return None
+
+def find_script_token(html):
+    """token from the reboot page script: ... { token: '<token>' } ..."""
+    script = html.find("<script")
+    start = html.find(_SCRIPT_TOKEN, script) if script != -1 else -1
+    if start == -1:
+        return None
+    start += len(_SCRIPT_TOKEN)
+    end = html.find("'", start)
+    return html[start:end] if end != -1 else None
+
+def form_fields(html, prefix="cbid."):
+    """
+    {name: value} of the form fields whose name starts with prefix.
+
+    Checkboxes/radios count only when checked; a <select> gives its
+    selected option (or the first one).
+    """
+    fields = {}
+    for m in _FIELD.finditer(html):
+        if m.group(1):
+            a = attrs(m.group(2))
+            name = a.get("name", "")
+            if not name.startswith(prefix) or name in fields:
+                continue
+            if a.get("type", "").lower() in ("checkbox", "radio") and "checked" not in a:
+                continue
+            fields[name] = a.get("value", "")
+        elif m.group(3):
+            name = attrs(m.group(4)).get("name", "")
+            if not name.startswith(prefix) or name in fields:
+                continue
+            options = [attrs(o.group(1)) for o in _OPTION.finditer(m.group(5))]
+            chosen = next((o for o in options if "selected" in o), options[0] if options else None)
+            fields[name] = chosen.get("value", "") if chosen else ""
+        else:
+            name = attrs(m.group(7)).get("name", "")
+            if name.startswith(prefix) and name not in fields:
+                fields[name] = unescape(m.group(8))
+    return fields
+
+def parse_form(html, prefix="cbid."):
+    """{"token": ..., "fields": {...}} for a LuCI CBI page"""
+    return {"token": find_token(html), "fields": form_fields(html, prefix)}
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+luci_schema.py - What a miner's LuCI expects, learned once per firmware
+
+Firmwares differ in the login form field names, in the key of the
+timezone field on the system page and in how the reboot call takes its
+token. The control flows used to try every variant on every run; now the
+variant that worked is remembered per firmware (fleet "model"/"firmware",
+or per miner while those are unknown) and tried first or alone. A cached
+answer that stops working is forgotten and the full search runs again.
+"""
+
+import os
+import threading
+import time
+
+from fleet import get_miner
+
+# هر چند وقت یک بار دوباره کشف شود (مثلاً بعد از آپدیت firmware بدون تغییر fleet.json)
+SCHEMA_TTL = float(os.environ.get("LUCI_SCHEMA_TTL", 86400))
+
+LOGIN_PAYLOADS = {
+    "luci": ("luci_username", "luci_password"),
+    "plain": ("username", "password"),
+}
+TZ_KEYS = (
+    "cbid.system.cfg02e48a.zonename",
+    "cbid.system.system.zonename",
+    "cbid.system.timezone",
+)
+REBOOT_FORMATS = ("form", "json")
+
+_lock = threading.Lock()
+_schemas = {}   # key -> {field: (value, learned_at)}
+
+def schema_key(miner_name):
+    """Firmware identity of a miner; the miner itself when the fleet does not know it"""
+    miner = get_miner(miner_name) or {}
+    if miner.get("firmware"):
+        return f"fw:{miner.get('model', '')}|{miner['firmware']}"
+    return f"miner:{miner_name}"
+
+def get(miner_name, field):
+    """Cached value of a schema field, or None"""
+    key = schema_key(miner_name)
+    with _lock:
+        entry = _schemas.get(key, {}).get(field)
+    if entry is None or time.time() - entry[1] >= SCHEMA_TTL:
+        return None
+    return entry[0]
+
+def learn(miner_name, field, value):
+    key = schema_key(miner_name)
+    with _lock:
+        previous = _schemas.setdefault(key, {}).get(field)
+        _schemas[key][field] = (value, time.time())
+    if previous is None or previous[0] != value:
+        print(f"🧩 LuCI schema {key}: {field} = {value}")
+
+def forget(miner_name, field=None):
+    """Drop one learned field (or all of them) for the miner's firmware"""
+    key = schema_key(miner_name)
+    with _lock:
+        if field is None:
+            _schemas.pop(key, None)
+        else:
+            _schemas.get(key, {}).pop(field, None)
+
+def ordered(miner_name, field, candidates):
+    """candidates with the learned one first"""
+    known = get(miner_name, field)
+    if known not in candidates:
+        return list(candidates)
+    return [known] + [c for c in candidates if c != known]
+
+def snapshot():
+    """{key: {field: value}} of everything learned"""
+    with _lock:
+        return {key: {f: v for f, (v, _) in fields.items()} for key, fields in _schemas.items()}
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+luci_session.py - Pool of authenticated LuCI sessions shared by pools, reboot and NTP
+
+One logged-in requests.Session is kept per (miner, username) for
+SESSION_TTL seconds. Sessions are not checked up front: an operation runs
+with the cached session and, if LuCI answers with a 403 or its login page,
+the pool logs in again and the operation is repeated once. Cookies are
+written to SESSION_FILE so sessions survive a restart.
+"""
+
+import json
+import os
+import threading
+import time
+
+import requests
+
+import luci_schema
+from fleet import web_url
+from metrics import luci_phase
+from transport import new_session
+
+SESSION_TTL = float(os.environ.get("LUCI_SESSION_TTL", 1800))
+SESSION_FILE = os.environ.get(
+    "LUCI_SESSION_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "luci_sessions.json"))
+LOGIN_PATH = "/cgi-bin/luci"
+LOGIN_GET_TIMEOUT = 10
+LOGIN_POST_TIMEOUT = 10
+
+requests.packages.urllib3.disable_warnings()
+
+class LoginError(Exception):
+    """Login to the miner web interface failed"""
+
+class SessionExpired(Exception):
+    """LuCI answered with its login page instead of the requested one"""
+
+_lock = threading.Lock()
+# (miner, username) -> {"session", "base", "created"}
+_pool = {}
+_miner_locks = {}
+_loaded = False
+_save_timer = None
+SAVE_DELAY = 1.0
+
+# ---------------- persistence ----------------
+def _cookies_to_list(jar):
+    return [{"name": c.name, "value": c.value, "domain": c.domain, "path": c.path} for c in jar]
+
+def _load():
+    global _loaded
+    _loaded = True
+    try:
+        with open(SESSION_FILE, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return
+    now = time.time()
+    for item in data.get("sessions", []):
+        if now - item.get("created", 0) >= SESSION_TTL:
+            continue
+        session = new_session()
+        for c in item.get("cookies", []):
+            session.cookies.set(c["name"], c["value"], domain=c.get("domain", ""), path=c.get("path", "/"))
+        _pool[(item["miner"], item["username"])] = {
+            "session": session, "base": item["base"], "created": item["created"]}
+
+def _save_soon():
+    """Coalesce saves: a bulk operation logging into 1000 miners writes the file once"""
+    global _save_timer
+    if _save_timer is None:
+        _save_timer = threading.Timer(SAVE_DELAY, _flush)
+        _save_timer.daemon = True
+        _save_timer.start()
+
+def _flush():
+    global _save_timer
+    with _lock:
+        _save_timer = None
+        _save()
+
+def _save():
+    items = []
+    for (miner, username), entry in list(_pool.items()):
+        items.append({"miner": miner, "username": username, "base": entry["base"],
+                      "created": entry["created"], "cookies": _cookies_to_list(entry["session"].cookies)})
+    tmp = f"{SESSION_FILE}.tmp"
+    try:
+        # cookies are credentials: owner-only file
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"sessions": items}, f)
+        os.replace(tmp, SESSION_FILE)
+    except OSError as e:
+        print(f"⚠️ Cannot save LuCI sessions: {e}")
+
+# ---------------- login ----------------
+def is_login_page(response):
+    """True when LuCI sent its login form / a redirect to it instead of the page"""
+    if response.status_code == 403:
+        return True
+    if response.status_code in (301, 302, 303) and "/admin" not in response.headers.get("Location", "/admin"):
+        return True
+    if response.history and response.url.rstrip("/").endswith(LOGIN_PATH):
+        return True
+    if response.status_code == 200 and 'name="luci_password"' in response.text:
+        return True
+    return False
+
+def ensure_authenticated(response):
+    """Raise SessionExpired when an operation response is the login page"""
+    if is_login_page(response):
+        raise SessionExpired()
+    return response
+
+def _login(miner_name, base, username, password, operation):
+    session = new_session()
+    login_url = f"{base}{LOGIN_PATH}"
+    with luci_phase(operation, "login"):
+        try:
+            # initial GET (some firmwares need the cookie it sets)
+            session.get(login_url, timeout=LOGIN_GET_TIMEOUT)
+        except Exception as e:
+            raise LoginError(f"GET login page failed: {e}")
+        # the payload shape that worked for this firmware goes first (luci_schema.py)
+        for shape in luci_schema.ordered(miner_name, "login", tuple(luci_schema.LOGIN_PAYLOADS)):
+            user_field, password_field = luci_schema.LOGIN_PAYLOADS[shape]
+            payload = {user_field: username, password_field: password}
+            try:
+                resp = session.post(login_url, data=payload, timeout=LOGIN_POST_TIMEOUT, allow_redirects=False)
+            except Exception as e:
+                raise LoginError(f"Login POST failed: {e}")
+            # sysauth, sysauth_https or sysauth_<port>, depending on the LuCI build
+            logged_in = any(c.name.startswith("sysauth") for c in session.cookies)
+            if resp.status_code in (302, 303) or (resp.status_code == 200 and logged_in):
+                luci_schema.learn(miner_name, "login", shape)
+                print(f"✅ Logged into miner {miner_name}")
+                return session
+    raise LoginError("Login failed with all payloads")
+
+def _miner_lock(key):
+    with _lock:
+        lock = _miner_locks.get(key)
+        if lock is None:
+            lock = _miner_locks[key] = threading.Lock()
+        return lock
+
+def get_session(miner_name, username, password, operation="luci", fresh=False):
+    """(session, base_url) for a miner; logs in only when no valid session is cached"""
+    base = web_url(miner_name)
+    if not base:
+        raise LoginError(f"Miner {miner_name} not found in fleet")
+    key = (str(miner_name), username)
+    with _miner_lock(key):
+        with _lock:
+            if not _loaded:
+                _load()
+            entry = _pool.get(key)
+        if (entry and not fresh and entry["base"] == base
+                and time.time() - entry["created"] < SESSION_TTL):
+            return entry["session"], base
+        session = _login(miner_name, base, username, password, operation)
+        with _lock:
+            _pool[key] = {"session": session, "base": base, "created": time.time()}
+            _save_soon()
+        return session, base
+
+def invalidate(miner_name, username=None):
+    """Forget cached sessions of a miner (e.g. after a reboot)"""
+    with _lock:
+        for key in [k for k in _pool if k[0] == str(miner_name) and (username is None or k[1] == username)]:
+            del _pool[key]
+        _save_soon()
+
+def run_with_session(miner_name, username, password, fn, operation="luci"):
+    """
+    Run fn(session, base_url) with a pooled session.
+
+    fn calls ensure_authenticated() on its responses; when the cached
+    session turns out to be expired the pool logs in again and fn runs once
+    more from the start (form tokens belong to the session).
+    """
+    session, base = get_session(miner_name, username, password, operation)
+    try:
+        return fn(session, base)
+    except SessionExpired:
+        print(f"🔐 Session of miner {miner_name} expired, logging in again...")
+        session, base = get_session(miner_name, username, password, operation, fresh=True)
+        try:
+            return fn(session, base)
+        except SessionExpired:
+            invalidate(miner_name, username)
+            raise LoginError("Login page returned after a fresh login")
@@ -2,87 +2,50 @@
 # -*- coding: utf-8 -*-
 
 import os
-import socket
 import json
-from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
 from datetime import datetime, timedelta
 import pytz
-from flask import Flask, render_template_string, request, jsonify
+from flask import Flask, Response, request, jsonify
 import jdatetime
 
 # ایمپورت از فایل‌های جدید
 from login_save import update_login_data, get_week_report
-from pools_manager import update_miner_pools, get_pools_manager_html
+from pools_manager import update_miner_pools, pools_error, worker_pools, get_pools_manager_html
 from reboot import reboot_miner, get_reboot_manager_html
+from rolling_reboot import rolling_reboot
 from terminal import execute_terminal_command, get_terminal_html
-from NTP import update_ntp_settings, get_ntp_html
+from NTP import update_ntp_settings, bulk_ntp_update, get_ntp_html
+from poller import start_poller, add_listener, get_snapshot, get_cached_miner
+from live_stream import publish_deltas, stream as live_stream
+from assets import externalize, serve_asset, compress_response
+from history import record_snapshot, get_history, BUCKET_SECONDS
+from telemetry_store import start_store, store_error, store_snapshot, query_range
+from miner_api import query_commands, bounded_gather, run
+from fleet import get_fleet, get_miner, miner_names, web_url
+from bulk import dispatch, is_success
+from jobs import submit, active_jobs, get_job, list_jobs, stream as stream_job
+import scheduler
+from metrics import POLL_MINER_SECONDS, POLL_CYCLE_SECONDS, RENDER_SECONDS, CONTENT_TYPE, render as render_metrics
 
 app = Flask(__name__)
 
 # === CONFIG ===
-MINER_IP = os.environ.get("MINER_IP")
 MINER_USERNAME = "admin"
 MINER_PASSWORD = os.environ.get("MINER_PASSWORD")
-MINER_NAMES = ["131", "132", "133", "65", "66", "70"]
-MINER_PORTS = [204, 205, 206, 304, 305, 306]
-
-# Map name -> port (سراسری، روابط لینک‌ها به این پورت‌ها خواهد بود)
-port_map = {
-    "131": 201,
-    "132": 202,
-    "133": 203,
-    "65": 301,
-    "66": 302,
-    "70": 303
-}
+# لیست ماینرها، پورت‌ها و گروه‌ها در fleet.json (ماژول fleet)
 
 SOCKET_TIMEOUT = 3.0
-MAX_WORKERS = 6
-COMMANDS = [{"command": "summary"}, {"command": "devs"}]
+# با "summary+devs" در یک اتصال خوانده می‌شوند (اگر فریمور پشتیبانی کند)
+COMMANDS = ["summary", "devs"]
 
 def build_miners():
-    ip = MINER_IP
     miners = []
-    for name, port in zip(MINER_NAMES, MINER_PORTS):
-        miners.append({"name": name, "ip": ip, "port": port})
+    for miner in get_fleet()["miners"]:
+        miners.append({"name": miner["name"], "ip": miner["host"], "port": miner["api_port"]})
     return miners
 
-# === TCP JSON sender ===
-def send_tcp_json(ip, port, payload):
-    if not ip:
-        return None
-    data = json.dumps(payload).encode("utf-8")
-    try:
-        with socket.create_connection((ip, port), timeout=SOCKET_TIMEOUT) as s:
-            s.settimeout(SOCKET_TIMEOUT)
-            s.sendall(data)
-            chunks = []
-            while True:
-                try:
-                    chunk = s.recv(4096)
-                    if not chunk:
-                        break
-                    chunks.append(chunk)
-                except socket.timeout:
-                    break
-            raw = b"".join(chunks).decode("utf-8", errors="ignore").strip()
-            if not raw:
-                return None
-            try:
-                return json.loads(raw)
-            except Exception:
-                first = raw.find("{")
-                last = raw.rfind("}")
-                if first != -1 and last != -1 and last > first:
-                    sub = raw[first:last+1]
-                    try:
-                        return json.loads(sub)
-                    except Exception:
-                        return None
-            return None
-    except Exception:
-        return None
-
 # === Helpers ===
 def format_seconds_pretty(sec: int):
     days, rem = divmod(sec, 86400)
@@ -121,9 +84,11 @@ def parse_summary(summary_json):
             hashrate = round(mhs_av / 1_000_000, 2)
         else:
             hashrate = mhs_av
-    uptime_str = format_seconds_pretty(int(uptime)) if uptime else None
+    uptime_sec = int(uptime) if uptime else None
+    uptime_str = format_seconds_pretty(uptime_sec) if uptime_sec else None
     return {
         "uptime": uptime_str,
+        "uptime_seconds": uptime_sec,
         "hashrate": hashrate,
         "power": int(power) if power else None,
         "temp_avg": round(temp, 1) if temp else None,
@@ -139,58 +104,93 @@ def parse_devs(devs_json):
             board_temps.append(round(temp, 1))
     return board_temps
 
-def poll_miner(miner):
+async def poll_miner_async(miner):
+    with POLL_MINER_SECONDS.time(miner["name"]):
+        return await _poll_miner_async(miner)
+
+async def _poll_miner_async(miner):
     ip = miner["ip"]
     port = miner["port"]
     result = {
+        "miner": miner["name"],
         "name": f"{miner['name']} ({port})",
         "alive": False,
         "hashrate": None,
         "uptime": None,
+        "uptime_seconds": None,
         "power": None,
         "board_temps": [],
+        "raw": {},
     }
     if not ip:
-        return result
-    responses = {}
-    any_response = False
-    for cmd in COMMANDS:
-        resp = send_tcp_json(ip, port, cmd)
-        if resp:
-            any_response = True
-            responses[cmd["command"]] = resp
-    if not any_response:
-        return result
+        return add_display_classes(result)
+    responses = await query_commands(ip, port, COMMANDS, SOCKET_TIMEOUT)
+    if not responses:
+        return add_display_classes(result)
     result["alive"] = True
+    result["raw"] = responses
     if "summary" in responses:
         summary = parse_summary(responses["summary"])
         result.update(
             {
                 "hashrate": summary.get("hashrate"),
                 "uptime": summary.get("uptime"),
+                "uptime_seconds": summary.get("uptime_seconds"),
                 "power": summary.get("power"),
             }
         )
     if "devs" in responses:
         boards = parse_devs(responses["devs"])
         result["board_temps"] = boards
+    return add_display_classes(result)
+
+# آستانه‌های رنگ جدول
+HASHRATE_LOW = 60
+TEMP_HIGH = 60
+UPTIME_NEW = 86400
+
+def add_display_classes(result):
+    """CSS classes for the dashboard, computed once per poll instead of per render"""
+    uptime_sec = result.get("uptime_seconds")
+    hashrate = result.get("hashrate")
+    result["uptime_class"] = None if uptime_sec is None else ("uptime-new" if uptime_sec < UPTIME_NEW else "uptime-old")
+    result["hashrate_class"] = None if hashrate is None else ("hash-low" if hashrate < HASHRATE_LOW else "hash-normal")
+    result["temp_cells"] = [(t, "temp-low" if t < TEMP_HIGH else "temp-high") for t in result.get("board_temps") or []]
     return result
 
-def get_live_data():
-    miners = build_miners() if MINER_IP else []
-    out = []
+def poll_miner(miner):
+    return run(poll_miner_async(miner))
+
+def offline_result(miner):
+    return add_display_classes({"miner": miner["name"], "name": f"{miner['name']} ({miner['port']})", "alive": False})
+
+def get_live_data(miners=None):
+    if miners is None:
+        miners = build_miners()
     if not miners:
         return []
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
-        futures = {ex.submit(poll_miner, m): m for m in miners}
-        for fut in futures:
-            try:
-                res = fut.result()
-            except Exception:
-                res = {"name": f"{futures[fut]['name']} ({futures[fut]['port']})", "alive": False}
-            out.append(res)
+    # همه ماینرها روی یک event loop، با سقف اتصال همزمان برای هر host
+    results = run(bounded_gather(poll_miner_async, miners, key=lambda m: m["ip"]))
+    out = []
+    for miner, res in zip(miners, results):
+        if isinstance(res, BaseException):
+            res = offline_result(miner)
+        out.append(res)
     return sorted(out, key=lambda x: x["name"])
 
+def poll_due_miners():
+    """
+    One poller cycle: healthy miners every time, offline ones on their
+    backoff schedule (scheduler.py). Returns only the miners polled now.
+    """
+    miners = build_miners()
+    due = set(scheduler.due([m["name"] for m in miners]))
+    with POLL_CYCLE_SECONDS.time():
+        results = get_live_data([m for m in miners if m["name"] in due])
+    for res in results:
+        scheduler.report(res["miner"], res.get("alive"))
+    return results
+
 def calculate_total_hashrate(miners):
     total = 0
     for miner in miners:
@@ -199,7 +199,7 @@ def calculate_total_hashrate(miners):
     return round(total, 2)
 
 # === FULL TEMPLATE (HTML/CSS/JS) ===
-TEMPLATE = """
+TEMPLATE_HEAD = """
 <!doctype html>
 <html lang="en" dir="ltr">
 <head>
@@ -276,10 +276,10 @@ tr:nth-child(even){background:#f8fafc;}
                 </div>
             </div>
             
-            <button class="icon-btn" title="Refresh" onclick="location.reload();">🔄</button>
+            <button class="icon-btn" title="Refresh" onclick="resyncLive();">🔄</button>
         </div>
         <div class="total-hashrate">
-            Total Hashrate: {{ total_hashrate }} TH/s
+            Total Hashrate: <span id="totalHashrate">{{ total_hashrate }}</span> TH/s
         </div>
     </div>
     <button class="report-btn" onclick="showLoginReport()">📊</button>
@@ -297,103 +297,23 @@ tr:nth-child(even){background:#f8fafc;}
 </thead>
 <tbody>
 {% for m in miners %}
-<tr>
-<td>
-<!-- لینک اصلاح شده: با استفاده از port_map سراسری و fallback به m.port -->
-<a href="https://{{ MINER_IP }}:{{ port_map.get(m.name.split(' ')[0], m.port) }}" target="_blank">{{ m.name }}</a>
-
-{% if m.alive %}
-<span class="status-online">Online</span>
-{% else %}
-<span class="status-offline">Offline</span>
-{% endif %}
-</td>
-
-<!-- Uptime -->
-<td>
-{% if m.uptime %}
-    {% set uptime_sec = 0 %}
-    {% if 'd' in m.uptime %}
-        {% set parts = m.uptime.split('d') %}
-        {% set uptime_sec = (parts[0] | int) * 86400 %}
-        {% if 'h' in parts[1] %}
-            {% set h_parts = parts[1].split('h') %}
-            {% set uptime_sec = uptime_sec + (h_parts[0]|int)*3600 %}
-            {% if 'm' in h_parts[1] %}
-                {% set m_parts = h_parts[1].split('m') %}
-                {% set uptime_sec = uptime_sec + (m_parts[0]|int)*60 %}
-            {% endif %}
-        {% endif %}
-    {% elif 'h' in m.uptime %}
-        {% set h_parts = m.uptime.split('h') %}
-        {% set uptime_sec = (h_parts[0]|int)*3600 %}
-        {% if 'm' in h_parts[1] %}
-            {% set m_parts = h_parts[1].split('m') %}
-            {% set uptime_sec = uptime_sec + (m_parts[0]|int)*60 %}
-        {% endif %}
-    {% elif 'm' in m.uptime %}
-        {% set uptime_sec = (m.uptime.split('m')[0]|int)*60 %}
-    {% endif %}
-    
-    {% if uptime_sec < 86400 %}
-        <span class="uptime-new">{{ m.uptime }}</span>
-    {% else %}
-        <span class="uptime-old">{{ m.uptime }}</span>
-    {% endif %}
-{% else %}
-    -
-{% endif %}
-</td>
-
-<!-- Temperature -->
-<td>
-{% if m.board_temps %}
-<div class="temp-container">
-  {% for temp in m.board_temps %}
-    {% if temp < 60 %}
-      <span class="temp-low">{{ temp }}</span>
-    {% else %}
-      <span class="temp-high">{{ temp }}</span>
-    {% endif %}
-  {% endfor %}
-</div>
-{% else %}
--
-{% endif %}
-</td>
-
-<!-- Hashrate -->
-<td>
-{% if m.hashrate %}
-  {% if m.hashrate < 60 %}
-    <span class="hash-low">{{ m.hashrate }}</span>
-  {% else %}
-    <span class="hash-normal">{{ m.hashrate }}</span>
-  {% endif %}
-{% else %}
-  -
-{% endif %}
-</td>
-
-<td>{{ m.power or "-" }}</td>
+<tr data-miner="{{ m['miner'] }}">
+<td><a href="{{ web_urls.get(m['miner'], '#') }}" target="_blank">{{ m['name'] }}</a>
+<span data-field="alive">{% if m['alive'] %}<span class="status-online">Online</span>{% else %}<span class="status-offline">Offline</span>{% endif %}</span></td>
+<td data-field="uptime">{% if m['uptime'] %}<span class="{{ m['uptime_class'] }}">{{ m['uptime'] }}</span>{% else %}-{% endif %}</td>
+<td data-field="board_temps">{% if m['temp_cells'] %}<div class="temp-container">{% for temp, cls in m['temp_cells'] %}<span class="{{ cls }}">{{ temp }}</span>{% endfor %}</div>{% else %}-{% endif %}</td>
+<td data-field="hashrate">{% if m['hashrate'] %}<span class="{{ m['hashrate_class'] }}">{{ m['hashrate'] }}</span>{% else %}-{% endif %}</td>
+<td data-field="power">{{ m['power'] or "-" }}</td>
 </tr>
 {% endfor %}
 </tbody>
 </table>
 </div>
 
-<!-- اضافه شدن پولز مودال -->
-""" + get_pools_manager_html() + """
-
-<!-- اضافه شدن ریبوت مودال -->
-""" + get_reboot_manager_html() + """
-
-<!-- اضافه شدن ترمینال مودال -->
-""" + get_terminal_html() + """
-
-<!-- اضافه شدن NTP مودال -->
-""" + get_ntp_html() + """
+"""
 
+# مودال‌ها از fleet ساخته می‌شوند، پس بین HEAD و TAIL قرار می‌گیرند
+TEMPLATE_TAIL = """
 <!-- Login Report Modal -->
 <div id="modalOverlay" class="modal-overlay" onclick="closeModal()"></div>
 <div id="reportModal" class="modal">
@@ -623,6 +543,107 @@ function sendCommand(){
     });
 }
 
+// آپدیت زنده جدول با SSE (بدون رفرش کل صفحه)
+let liveSource = null;
+
+// کلاس‌ها از سمت سرور می‌آیند (uptime_class, hashrate_class, temp_cells)
+const liveCells = {
+    alive: f => f.alive ? '<span class="status-online">Online</span>' : '<span class="status-offline">Offline</span>',
+    uptime: f => f.uptime ? '<span class="' + f.uptime_class + '">' + f.uptime + '</span>' : '-',
+    board_temps: f => (f.temp_cells && f.temp_cells.length)
+        ? '<div class="temp-container">' + f.temp_cells.map(c => '<span class="' + c[1] + '">' + c[0] + '</span>').join('') + '</div>'
+        : '-',
+    hashrate: f => f.hashrate ? '<span class="' + f.hashrate_class + '">' + f.hashrate + '</span>' : '-',
+    power: f => f.power || '-'
+};
+
+function applyMinerUpdate(name, fields) {
+    const row = document.querySelector('tr[data-miner="' + name + '"]');
+    if (!row) return;
+    for (const field in liveCells) {
+        const cell = row.querySelector('[data-field="' + field + '"]');
+        if (cell) {
+            cell.innerHTML = liveCells[field](fields);
+        }
+    }
+}
+
+// ردیف‌ها را سرور می‌سازد؛ اگر ماینری اضافه/حذف شده باشد صفحه دوباره بارگذاری می‌شود
+let rowsReloadPending = false;
+
+function renderedMiners() {
+    return Array.from(document.querySelectorAll('tr[data-miner]')).map(row => row.dataset.miner);
+}
+
+function rowsChanged(event, data) {
+    const rendered = renderedMiners();
+    const names = Object.keys(data.miners || {});
+    if (names.some(name => !rendered.includes(name))) return true;
+    if ((data.removed || []).some(name => rendered.includes(name))) return true;
+    // the snapshot event carries the full fleet: rows of removed miners count too
+    return event.type === 'snapshot' && names.length > 0 && rendered.some(name => !names.includes(name));
+}
+
+function reloadForRows() {
+    // background jobs keep running, but do not close a modal under the user
+    const modalOpen = Array.from(document.querySelectorAll('.modal')).some(m => m.style.display === 'block');
+    const lastReload = Number(sessionStorage.getItem('rowsReloadAt') || 0);
+    if (modalOpen || Date.now() - lastReload < 30000) {
+        if (!rowsReloadPending) {
+            rowsReloadPending = true;
+            setTimeout(() => { rowsReloadPending = false; reloadForRows(); }, 5000);
+        }
+        return;
+    }
+    sessionStorage.setItem('rowsReloadAt', String(Date.now()));
+    location.reload();
+}
+
+function applyLiveMessage(event) {
+    const data = JSON.parse(event.data);
+    if (rowsChanged(event, data)) {
+        reloadForRows();
+    }
+    for (const name in data.miners) {
+        applyMinerUpdate(name, data.miners[name]);
+    }
+    if (data.total_hashrate !== null && data.total_hashrate !== undefined) {
+        document.getElementById('totalHashrate').textContent = data.total_hashrate;
+    }
+}
+
+function startLive() {
+    if (!window.EventSource) return;
+    liveSource = new EventSource('/stream/miners');
+    liveSource.addEventListener('snapshot', applyLiveMessage);
+    liveSource.addEventListener('delta', applyLiveMessage);
+}
+
+function resyncLive() {
+    if (!window.EventSource) { location.reload(); return; }
+    if (liveSource) liveSource.close();
+    startLive();
+}
+
+document.addEventListener('DOMContentLoaded', startLive);
+
+// control jobs (pools, reboot, NTP): the route answers at once with a job id,
+// progress comes from /jobs/<id>/events; the summary is the job result
+function followJob(response, onEvent, onDone) {
+    return response.json().then(job => {
+        if (!response.ok) throw new Error(job.error || ('HTTP ' + response.status));
+        const source = new EventSource(job.events_url);
+        source.addEventListener('progress', e => onEvent(JSON.parse(e.data)));
+        source.addEventListener('done', e => {
+            source.close();
+            const finished = JSON.parse(e.data);
+            onEvent({summary: finished.state === 'failed' ? {error: finished.error} : finished.result});
+            if (onDone) onDone(finished);
+        });
+        return job;
+    });
+}
+
 // بستن با کلیک خارج از مودال‌ها
 document.addEventListener('DOMContentLoaded', function() {
     const poolsOverlay = document.getElementById('poolsModalOverlay');
@@ -648,21 +669,73 @@ document.addEventListener('DOMContentLoaded', function() {
 </html>
 
 """
+
+def build_template():
+    return (
+        TEMPLATE_HEAD
+        + "\n<!-- اضافه شدن پولز مودال -->\n" + get_pools_manager_html()
+        + "\n\n<!-- اضافه شدن ریبوت مودال -->\n" + get_reboot_manager_html()
+        + "\n\n<!-- اضافه شدن ترمینال مودال -->\n" + get_terminal_html()
+        + "\n\n<!-- اضافه شدن NTP مودال -->\n" + get_ntp_html()
+        + "\n" + TEMPLATE_TAIL
+    )
+
+# CSS/JS ثابت به فایل‌های کش‌شدنی منتقل می‌شوند و قالب فقط وقتی fleet.json
+# تغییر کند دوباره کامپایل می‌شود
+_dashboard = {"version": None, "template": None, "web_urls": {}}
+_dashboard_lock = threading.Lock()
+
+def get_dashboard():
+    global _dashboard
+    fleet = get_fleet()
+    if _dashboard["version"] != fleet["version"]:
+        with _dashboard_lock:
+            if _dashboard["version"] != fleet["version"]:
+                _dashboard = {
+                    "version": fleet["version"],
+                    "template": app.jinja_env.from_string(externalize(build_template())),
+                    "web_urls": {m["name"]: web_url(m) or "#" for m in fleet["miners"]},
+                }
+    return _dashboard
+
 # === ROUTES ===
+# هر snapshot جدید در تاریخچه (حافظه و دیسک) ثبت می‌شود
+add_listener(record_snapshot)
+add_listener(store_snapshot)
+add_listener(publish_deltas)
+
+@app.before_request
+def ensure_poller():
+    # پولر پس‌زمینه فقط یک بار اجرا می‌شود
+    start_store()
+    start_poller(poll_due_miners, roster=miner_names)
+
 @app.route("/", methods=["GET", "POST"])
 def index():
     # ثبت لاگین فقط در صورت رفرش/باز شدن صفحه
     update_login_data()
-    miners = get_live_data()
+    # داده‌ها از snapshot پولر خوانده می‌شوند، نه مستقیم از ماینرها
+    miners = get_snapshot(wait=True)["miners"]
     total_hashrate = calculate_total_hashrate(miners)
-    return render_template_string(
-        TEMPLATE,
-        miners=miners,
-        total_hashrate=total_hashrate,
-        MINER_IP=MINER_IP or "127.0.0.1",
-        port_map=port_map,
-        MINER_NAMES=MINER_NAMES
-    )
+    dashboard = get_dashboard()
+    with RENDER_SECONDS.time():
+        html = dashboard["template"].render(
+            miners=miners,
+            total_hashrate=total_hashrate,
+            web_urls=dashboard["web_urls"],
+            MINER_NAMES=miner_names()
+        )
+    return compress_response(html, "text/html")
+
+@app.route("/metrics")
+def metrics_route():
+    """Prometheus scrape endpoint"""
+    return Response(render_metrics(), content_type=CONTENT_TYPE)
+
+@app.route("/assets/<name>")
+def assets_route(name):
+    """Fingerprinted modal CSS/JS (immutable, gzip negotiated)"""
+    return serve_asset(name, build=get_dashboard)
 
 @app.route("/terminal_command", methods=["POST"])
 def terminal_command():
@@ -675,15 +748,79 @@ def terminal_command():
         result = execute_terminal_command(
             miner_name, 
             cmd, 
-            MINER_IP, 
-            MINER_NAMES, 
-            MINER_PORTS
+            cached=get_cached_miner
         )
         return jsonify(result)
 
     except Exception as e:
         return jsonify({"error": str(e)})
 
+# بدنه JSON هر نسخه از snapshot فقط یک بار ساخته می‌شود
+BOOT_ID = format(int(time.time()), "x")
+_api_cache = {"version": None, "etag": None, "body": b""}
+_api_lock = threading.Lock()
+
+def snapshot_json():
+    """(etag, body) for the current snapshot, serialized once per version"""
+    snapshot = get_snapshot(wait=True)
+    version = snapshot["version"]
+    with _api_lock:
+        if _api_cache["version"] != version:
+            miners = snapshot["public"]
+            body = json.dumps(
+                {
+                    "version": version,
+                    "updated_at": snapshot["updated_at"],
+                    "total_hashrate": calculate_total_hashrate(miners),
+                    "miners": miners,
+                },
+                separators=(",", ":"),
+                ensure_ascii=False,
+            ).encode("utf-8")
+            _api_cache.update(version=version, etag=f"{BOOT_ID}-{version}", body=body)
+        return _api_cache["etag"], _api_cache["body"]
+
+@app.route("/api/miners")
+def api_miners():
+    """Fleet snapshot as compact JSON with ETag / If-None-Match"""
+    etag, body = snapshot_json()
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        resp = Response(body, mimetype="application/json")
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+@app.route("/stream/miners")
+def stream_miners():
+    """SSE: full state once, then only miners whose fields changed"""
+    resp = Response(live_stream(), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
+@app.route("/api/history/<miner>")
+def api_history(miner):
+    """15m / 1h / 24h avg, min and max for one miner"""
+    stats = get_history(miner)
+    if stats is None:
+        return jsonify({"error": f"No history for miner {miner}"}), 404
+    return jsonify({"miner": miner, "bucket_seconds": BUCKET_SECONDS, "metrics": stats})
+
+@app.route("/api/history/<miner>/range")
+def api_history_range(miner):
+    """Stored samples/rollups: ?start=&end= (epoch seconds), optional &resolution=raw|1m|1h|1d"""
+    if store_error():
+        return jsonify({"error": f"Telemetry store unavailable: {store_error()}"}), 503
+    try:
+        end = float(request.args.get("end") or datetime.now().timestamp())
+        start = float(request.args.get("start") or end - 86400)
+        data = query_range(miner, start, end, request.args.get("resolution"))
+        return jsonify({"miner": miner, "start": int(start), "end": int(end), **data})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
 @app.route("/get_login_report")
 def get_login_report():
     try:
@@ -693,58 +830,182 @@ def get_login_report():
         print(f"Error in get_login_report: {e}")
         return jsonify({"saturday": "Error", "days": []})
 
+def job_accepted(job):
+    """202 with the job; progress at /jobs/<id> and /jobs/<id>/events"""
+    resp = jsonify(dict(job, status_url=f"/jobs/{job['id']}", events_url=f"/jobs/{job['id']}/events"))
+    resp.status_code = 202
+    resp.headers["Location"] = f"/jobs/{job['id']}"
+    return resp
+
+def single_miner_job(kind, miner_name, call):
+    """Job around one control call; the call's result dict is the job result"""
+    def fn(emit):
+        result = call()
+        emit({"miner": str(miner_name), "ok": is_success(result), "result": result, "done": 1, "total": 1})
+        return result
+    return submit(kind, fn, [miner_name], check=is_success)
+
+def check_miners(names):
+    """Error response unless names is a non-empty list of fleet miners, else None"""
+    if not names:
+        return jsonify({"error": "Missing miners"}), 400
+    if not isinstance(names, list):
+        return jsonify({"error": "miners must be a list of miner names"}), 400
+    unknown = [str(n) for n in names if get_miner(n) is None]
+    if unknown:
+        return jsonify({"error": f"Unknown miners: {', '.join(unknown)}"}), 400
+    return None
+
 @app.route("/update_pools", methods=["POST"])
 def update_pools():
-    """Update pool settings for a miner"""
-    try:
-        data = request.get_json()
-        miner_name = data.get("miner")
-        pools_data = data.get("pools")
-
-        if not miner_name or not pools_data:
-            return jsonify({"error": "Missing miner or pools data"})
-
-        result = update_miner_pools(miner_name, pools_data, MINER_USERNAME, MINER_PASSWORD)
-        return jsonify(result)
-
-    except Exception as e:
-        return jsonify({"error": str(e)})
+    """Update pool settings for a miner (background job)"""
+    data = request.get_json(silent=True) or {}
+    miner_name = data.get("miner")
+    pools_data = data.get("pools")
+
+    if not miner_name or not pools_data:
+        return jsonify({"error": "Missing miner or pools data"}), 400
+    error = pools_error(pools_data)
+    if error:
+        return jsonify({"error": error}), 400
+    error = check_miners([miner_name])
+    if error:
+        return error
+
+    job = single_miner_job("pools", miner_name, lambda: update_miner_pools(
+        miner_name, pools_data, MINER_USERNAME, MINER_PASSWORD))
+    return job_accepted(job)
+
+@app.route("/update_pools_bulk", methods=["POST"])
+def update_pools_bulk():
+    """Apply one pools template to many miners; workers become <worker>.<miner>"""
+    data = request.get_json(silent=True) or {}
+    names = data.get("miners")
+    pools_data = data.get("pools")
+
+    if not pools_data:
+        return jsonify({"error": "Missing pools data"}), 400
+    error = pools_error(pools_data)
+    if error:
+        return jsonify({"error": error}), 400
+    error = check_miners(names)
+    if error:
+        return error
+    names = [str(n) for n in names]
+
+    def apply(name):
+        return update_miner_pools(name, worker_pools(pools_data, name), MINER_USERNAME, MINER_PASSWORD)
+
+    job = submit("pools_bulk", lambda emit: dispatch(names, apply, emit), names, long=True)
+    return job_accepted(job)
 
 @app.route("/reboot_miner", methods=["POST"])
 def reboot_miner_route():
-    """Reboot a miner"""
+    """Reboot a miner (background job)"""
+    data = request.get_json(silent=True) or {}
+    miner_name = data.get("miner")
+
+    if not miner_name:
+        return jsonify({"error": "Missing miner name"}), 400
+    error = check_miners([miner_name])
+    if error:
+        return error
+
+    job = single_miner_job("reboot", miner_name, lambda: reboot_miner(
+        miner_name, MINER_USERNAME, MINER_PASSWORD))
+    return job_accepted(job)
+
+@app.route("/reboot_rolling", methods=["POST"])
+def reboot_rolling():
+    """Reboot many miners in waves (background job, runs until the last wave is back)"""
+    data = request.get_json(silent=True) or {}
+    names = data.get("miners")
     try:
-        data = request.get_json()
-        miner_name = data.get("miner")
-
-        if not miner_name:
-            return jsonify({"error": "Missing miner name"})
-
-        result = reboot_miner(miner_name, MINER_USERNAME, MINER_PASSWORD)
-        return jsonify(result)
-
-    except Exception as e:
-        return jsonify({"error": str(e)})
+        wave_size = int(data.get("wave_size") or 0) or None
+        max_down = int(data.get("max_down") or 0) or None
+    except (TypeError, ValueError):
+        return jsonify({"error": "wave_size and max_down must be numbers"}), 400
+    error = check_miners(names)
+    if error:
+        return error
+    names = [str(n) for n in names]
+    # two rollouts at once would each keep to max_down and together exceed it
+    running = active_jobs("reboot_rolling")
+    if running:
+        return jsonify({"error": f"Rolling reboot {running[0]['id']} is still running",
+                        "job_id": running[0]["id"]}), 409
+
+    job = submit("reboot_rolling", lambda emit: rolling_reboot(names, emit, wave_size, max_down),
+                 names, {"wave_size": wave_size, "max_down": max_down}, long=True)
+    return job_accepted(job)
 
 # اضافه شدن route برای NTP
 @app.route("/update_ntp", methods=["POST"])
 def update_ntp():
-    """Update NTP settings for a miner"""
-    try:
-        data = request.get_json()
-        miner_name = data.get("miner")
-        timezone = data.get("timezone")
-        ntp_enabled = data.get("ntp_enabled")
-        ntp_servers = data.get("ntp_servers")
-
-        if not miner_name:
-            return jsonify({"error": "Missing miner name"})
-
-        result = update_ntp_settings(miner_name, timezone, ntp_servers, ntp_enabled, MINER_USERNAME, MINER_PASSWORD)
-        return jsonify(result)
+    """Update NTP settings for a miner (background job)"""
+    data = request.get_json(silent=True) or {}
+    miner_name = data.get("miner")
+    timezone = data.get("timezone")
+    ntp_enabled = data.get("ntp_enabled")
+    ntp_servers = data.get("ntp_servers")
+
+    if not miner_name:
+        return jsonify({"error": "Missing miner name"}), 400
+    error = check_miners([miner_name])
+    if error:
+        return error
+
+    job = single_miner_job("ntp", miner_name, lambda: update_ntp_settings(
+        miner_name, timezone, ntp_servers, ntp_enabled, MINER_USERNAME, MINER_PASSWORD))
+    return job_accepted(job)
+
+@app.route("/update_ntp_bulk", methods=["POST"])
+def update_ntp_bulk():
+    """NTP/timezone for many miners (default: whole fleet) as a background job"""
+    data = request.get_json(silent=True) or {}
+    names = data.get("miners")
+    if names is None:
+        names = miner_names()
+    error = check_miners(names)
+    if error:
+        return error
+    names = [str(n) for n in names]
+    params = {
+        "enable_ntp": data.get("ntp_enabled", True),
+        "custom_servers": data.get("ntp_servers"),
+        "timezone": data.get("timezone") or "Asia/Tehran",
+    }
 
-    except Exception as e:
-        return jsonify({"error": str(e)})
+    job = submit("ntp_bulk", lambda emit: bulk_ntp_update(
+        names, emit, username=MINER_USERNAME, password=MINER_PASSWORD, **params), names, params, long=True)
+    return job_accepted(job)
+
+@app.route("/jobs")
+def jobs_route():
+    """All kept jobs, newest first; ?state=queued|running|done|failed"""
+    return jsonify({"jobs": list_jobs(request.args.get("state"))})
+
+@app.route("/jobs/<job_id>")
+def job_route(job_id):
+    """Status and result of one job; ?events=1 adds the progress events"""
+    job = get_job(job_id, events=request.args.get("events") == "1")
+    if job is None:
+        return jsonify({"error": f"No job {job_id}"}), 404
+    return jsonify(job)
+
+@app.route("/jobs/<job_id>/events")
+def job_events_route(job_id):
+    """SSE: replays the job's progress events, follows it live and ends with a "done" event"""
+    if get_job(job_id) is None:
+        return jsonify({"error": f"No job {job_id}"}), 404
+    try:
+        last_id = int(request.headers.get("Last-Event-ID") or 0)
+    except ValueError:
+        last_id = 0
+    resp = Response(stream_job(job_id, last_id), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
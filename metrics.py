@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+metrics.py - In-process histograms/counters exposed in Prometheus text format
+
+Recording is a dict lookup, a bisect and a few additions under a lock; the
+text format is only built when /metrics is scraped.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# seconds: 1ms .. 30s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry = []
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra=""):
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _num(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        with self._lock:
+            return self._values.get(label_values, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for values, total in items:
+            lines.append(f"{self.name}{_labels(self.labels, values)} {_num(total)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *label_values):
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][idx] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *label_values):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def quantile(self, q, *label_values):
+        """Estimate a quantile from the buckets (like histogram_quantile)"""
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None or not series[2]:
+                return None
+            counts = list(series[0])
+        rank = q * sum(counts)
+        cumulative, lower = 0, 0.0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            if n and cumulative + n >= rank:
+                if bound == float("inf"):
+                    return lower
+                return lower + (bound - lower) * (rank - cumulative) / n
+            cumulative += n
+            lower = bound
+        return lower
+
+    def count(self, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            return series[2] if series else 0
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._series.items())
+        for values, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{_num(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, values)} {total!r}")
+            lines.append(f"{self.name}_count{_labels(self.labels, values)} {count}")
+        return lines
+
+def render():
+    """All registered metrics in Prometheus text exposition format"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# ---------------- panel metrics ----------------
+MINER_API_SECONDS = Histogram(
+    "miner_api_request_seconds", "Miner JSON API round trip (send_tcp_json/query)", ("miner", "command"))
+MINER_API_TIMEOUTS = Counter(
+    "miner_api_timeouts_total", "Miner JSON API connects/reads that hit the deadline", ("miner", "command", "phase"))
+MINER_API_FALLBACK_PARSES = Counter(
+    "miner_api_fallback_parses_total", "Responses that needed the lenient find('{') decoder", ("miner", "command"))
+POLL_MINER_SECONDS = Histogram(
+    "poll_miner_seconds", "Total time to poll one miner", ("miner",))
+POLL_CYCLE_SECONDS = Histogram(
+    "poll_cycle_seconds", "Time of one background poller cycle")
+RENDER_SECONDS = Histogram(
+    "dashboard_render_seconds", "Dashboard template render time")
+LUCI_PHASE_SECONDS = Histogram(
+    "luci_phase_seconds", "LuCI web request phases", ("operation", "phase"))
+
+def luci_phase(operation, phase):
+    """with luci_phase("reboot", "login"): ..."""
+    return LUCI_PHASE_SECONDS.time(operation, phase)
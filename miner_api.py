@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+miner_api.py - asyncio client for the cgminer/btminer JSON API (port 4028)
+
+All miners are polled on one event loop; every connection has its own
+deadline so a dead miner never holds more than SOCKET_TIMEOUT seconds.
+"""
+
+import asyncio
+import json
+import os
+import re
+import time
+
+from fleet import get_fleet
+from metrics import MINER_API_SECONDS, MINER_API_TIMEOUTS, MINER_API_FALLBACK_PARSES
+
+API_PORT = 4028
+SOCKET_TIMEOUT = 3.0
+# حداکثر تعداد سوکت‌های همزمان روی یک event loop
+MAX_CONCURRENCY = int(os.environ.get("MINER_API_CONCURRENCY", 512))
+# حداکثر اتصال همزمان به یک host (یک gateway/NAT)
+PER_HOST_CONCURRENCY = int(os.environ.get("MINER_API_PER_HOST", 64))
+READ_CHUNK = 4096
+# بعد از این مدت دوباره دستور ترکیبی امتحان می‌شود (مثلاً ماینری که وسط ریبوت بود)
+BATCH_RETRY_SECONDS = float(os.environ.get("MINER_API_BATCH_RETRY", 600))
+
+# only these bytes matter for finding the end of a response
+_FRAME_BYTES = re.compile(rb'[\x00"\\{}\[\]]')
+
+class ResponseFramer:
+    """
+    Incremental end-of-response detector.
+
+    A response is complete at the first NUL terminator (cgminer) or when
+    the top-level JSON object/array closes (btminer keeps the socket open).
+    """
+
+    def __init__(self):
+        self.buf = bytearray()
+        self.start = -1
+        self.end = -1
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self.fallback = False
+
+    def feed(self, chunk):
+        """Append data; return True once a complete response is buffered"""
+        self.buf += chunk
+        buf = self.buf
+        pos = self._pos
+        for m in _FRAME_BYTES.finditer(buf, pos):
+            i = m.start()
+            if i < pos:
+                # escaped character inside a string
+                continue
+            c = buf[i]
+            pos = i + 1
+            if c == 0:
+                self.end = i
+                break
+            if self._in_string:
+                if c == 0x5C:  # backslash: skip the escaped byte
+                    pos = i + 2
+                elif c == 0x22:
+                    self._in_string = False
+                continue
+            if c == 0x22:
+                self._in_string = True
+            elif c in (0x7B, 0x5B):
+                if self.start == -1:
+                    self.start = i
+                self._depth += 1
+            elif c in (0x7D, 0x5D) and self._depth:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.end = pos
+                    break
+        self._pos = pos
+        return self.end != -1
+
+    def result(self):
+        """Parse the framed response, falling back to the lenient decoder"""
+        if self.end != -1 and self.start != -1 and self.start < self.end:
+            try:
+                return json.loads(self.buf[self.start:self.end])
+            except Exception:
+                pass
+        value, self.fallback = _decode(bytes(self.buf))
+        return value
+
+def decode_response(raw):
+    """bytes -> dict (or None), tolerating garbage around the JSON body"""
+    return _decode(raw)[0]
+
+def _decode(raw):
+    """(value, used the find("{") fallback)"""
+    raw = raw.decode("utf-8", errors="ignore").strip()
+    if not raw:
+        return None, False
+    try:
+        return json.loads(raw), False
+    except Exception:
+        first = raw.find("{")
+        last = raw.rfind("}")
+        if first != -1 and last != -1 and last > first:
+            sub = raw[first:last+1]
+            try:
+                return json.loads(sub), True
+            except Exception:
+                return None, True
+    return None, False
+
+def _miner_label(ip, port):
+    # only fleet miners get their own series (scans would explode the label set)
+    miner = get_fleet()["by_address"].get((ip, port))
+    return miner["name"] if miner else "unknown"
+
+async def query(ip, port, payload, timeout=SOCKET_TIMEOUT, connect_timeout=None):
+    """
+    Send one JSON command and return the parsed response or None.
+
+    connect_timeout (default: timeout) lets scanners give up on silent
+    addresses quickly while still allowing a slow reply from a live miner.
+    """
+    if not ip:
+        return None
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    data = json.dumps(payload).encode("utf-8")
+    command = str(payload.get("command")) if isinstance(payload, dict) else "?"
+    started = time.perf_counter()
+    writer = None
+    try:
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(ip, port), min(connect_timeout or timeout, timeout))
+        except asyncio.TimeoutError:
+            MINER_API_TIMEOUTS.inc(_miner_label(ip, port), command, "connect")
+            return None
+        writer.write(data)
+        await writer.drain()
+        framer = ResponseFramer()
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                MINER_API_TIMEOUTS.inc(_miner_label(ip, port), command, "read")
+                break
+            try:
+                chunk = await asyncio.wait_for(reader.read(READ_CHUNK), remaining)
+            except asyncio.TimeoutError:
+                MINER_API_TIMEOUTS.inc(_miner_label(ip, port), command, "read")
+                break
+            if not chunk:
+                break
+            # پاسخ کامل شد؛ منتظر بسته شدن سوکت نمی‌مانیم
+            if framer.feed(chunk):
+                break
+        result = framer.result()
+        if framer.fallback:
+            MINER_API_FALLBACK_PARSES.inc(_miner_label(ip, port), command)
+        return result
+    except Exception:
+        return None
+    finally:
+        if writer is not None:
+            writer.close()
+        MINER_API_SECONDS.observe(time.perf_counter() - started, _miner_label(ip, port), command)
+
+# (ip, port) -> (True/False, time.monotonic()) once we know whether "summary+devs" works
+_batch_support = {}
+
+def _batch_state(key):
+    """True / False, or None while unknown; a "no" expires after BATCH_RETRY_SECONDS"""
+    entry = _batch_support.get(key)
+    if entry is None:
+        return None
+    supported, at = entry
+    if not supported and time.monotonic() - at >= BATCH_RETRY_SECONDS:
+        return None
+    return supported
+
+def split_batch(resp, names):
+    """Split a joined-command response into {name: single response}"""
+    if not isinstance(resp, dict):
+        return None
+    out = {}
+    for name in names:
+        part = resp.get(name)
+        if not isinstance(part, list) or not part or not isinstance(part[0], dict):
+            return None
+        out[name] = part[0]
+    return out
+
+async def query_commands(ip, port, names, timeout=SOCKET_TIMEOUT):
+    """
+    Run several read-only commands, joined as "a+b" in one round trip when
+    the firmware supports it. Returns {name: response} for those answered.
+    """
+    key = (ip, port)
+    state = _batch_state(key)
+    silent = False
+    if len(names) > 1 and state is not False:
+        resp = await query(ip, port, {"command": "+".join(names)}, timeout)
+        parts = split_batch(resp, names)
+        if parts is not None:
+            _batch_support[key] = (True, time.monotonic())
+            return parts
+        if resp is None and state:
+            # known batch-capable miner that did not answer: offline
+            return {}
+        if resp is not None:
+            # answered but rejected the joined command
+            _batch_support[key] = (False, time.monotonic())
+        silent = resp is None
+    responses = {}
+    for name in names:
+        resp = await query(ip, port, {"command": name}, timeout)
+        if resp:
+            responses[name] = resp
+        elif silent and not responses:
+            # no answer to the joined or the first single command: offline
+            return {}
+    if responses and len(names) > 1 and state is None:
+        # silently dropped the joined command but answers single ones (or it timed out)
+        _batch_support[key] = (False, time.monotonic())
+    return responses
+
+async def bounded_gather(func, items, limit=None, key=None, per_key=None):
+    """
+    Run func(item) for every item with at most `limit` in flight.
+
+    With key=item -> host, at most `per_key` items of the same host run at
+    once. The host slot is taken first, so items queued behind a busy
+    gateway do not hold global slots that other hosts could use.
+    Limits default to MAX_CONCURRENCY / PER_HOST_CONCURRENCY at call time.
+    """
+    sem = asyncio.Semaphore(limit or MAX_CONCURRENCY)
+    per_key = per_key or PER_HOST_CONCURRENCY
+    host_sems = {}
+
+    async def one(item):
+        async with sem:
+            return await func(item)
+
+    async def one_keyed(item):
+        k = key(item)
+        host_sem = host_sems.get(k)
+        if host_sem is None:
+            host_sem = host_sems[k] = asyncio.Semaphore(per_key)
+        async with host_sem:
+            return await one(item)
+
+    runner = one if key is None else one_keyed
+    return await asyncio.gather(*(runner(i) for i in items), return_exceptions=True)
+
+async def query_many(targets, payload, timeout=SOCKET_TIMEOUT, limit=None):
+    """Send the same command to many (ip, port) targets concurrently"""
+    async def one(target):
+        return await query(target[0], target[1], payload, timeout)
+    results = await bounded_gather(one, targets, limit, key=lambda t: t[0])
+    return [None if isinstance(r, BaseException) else r for r in results]
+
+# ---------------- sync wrappers (Flask routes, terminal) ----------------
+def run(coro):
+    """Run a coroutine to completion from synchronous code"""
+    return asyncio.run(coro)
+
+def send_tcp_json(ip, port, payload, timeout=SOCKET_TIMEOUT):
+    """Blocking drop-in for the old socket based sender"""
+    if not ip:
+        return None
+    return run(query(ip, port, payload, timeout))
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+poller.py - Background fleet poller with a shared snapshot
+
+fetch() may return results for only part of the fleet (see scheduler.py);
+with a roster the poller keeps the previous result of every miner that was
+not polled in this cycle.
+"""
+
+import os
+import threading
+import time
+
+from miner_api import SOCKET_TIMEOUT
+
+# هر چند ثانیه یک بار کل ماینرها خوانده شوند
+POLL_INTERVAL = float(os.environ.get("POLL_INTERVAL", 10))
+# a miner that never answers costs the joined command plus one single command
+FIRST_SNAPSHOT_WAIT = max(5.0, 2 * SOCKET_TIMEOUT + 1.0)
+
+_lock = threading.Lock()
+_ready = threading.Event()
+_thread = None
+_listeners = []
+
+# snapshot is replaced as a whole, readers never see a half-updated fleet
+_snapshot = {
+    "miners": [],
+    "public": [],
+    "by_name": {},
+    "updated_at": None,
+    "duration": None,
+    "version": 0,
+}
+
+def _public(miners):
+    # raw API responses are not part of what clients see
+    return [{k: v for k, v in m.items() if k != "raw"} for m in miners]
+
+def _publish(miners, duration):
+    global _snapshot
+    with _lock:
+        public = _public(miners)
+        # version only moves when the data clients see has changed
+        changed = public != _snapshot.get("public")
+        _snapshot = {
+            "miners": miners,
+            "public": public,
+            "by_name": {m.get("miner"): m for m in miners},
+            "updated_at": time.time(),
+            "duration": round(duration, 3),
+            "version": _snapshot["version"] + (1 if changed else 0),
+        }
+        snapshot = _snapshot
+    _ready.set()
+    for listener in list(_listeners):
+        try:
+            listener(snapshot)
+        except Exception as e:
+            print(f"❌ Snapshot listener error: {e}")
+
+def _merge(partial, roster):
+    """Latest result per miner of the roster, partial results win"""
+    by_name = dict(_snapshot["by_name"])
+    for m in partial:
+        by_name[m.get("miner")] = m
+    names = roster()
+    return sorted((by_name[n] for n in names if n in by_name), key=lambda x: x["name"])
+
+def _run(fetch, interval, roster=None):
+    while True:
+        started = time.monotonic()
+        try:
+            miners = fetch()
+            if roster is not None:
+                miners = _merge(miners, roster)
+        except Exception as e:
+            print(f"❌ Poller error: {e}")
+        else:
+            _publish(miners, time.monotonic() - started)
+        elapsed = time.monotonic() - started
+        time.sleep(max(0.5, interval - elapsed))
+
+def add_listener(fn):
+    """Call fn(snapshot) from the poller thread after every refresh"""
+    if fn not in _listeners:
+        _listeners.append(fn)
+
+def start_poller(fetch, interval=POLL_INTERVAL, roster=None):
+    """
+    Start the background poller once; later calls are no-ops.
+
+    roster: optional callable returning the names of all miners; when given,
+    fetch() only has to return the miners it actually polled.
+    """
+    global _thread
+    if _thread is not None:
+        return _thread
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_run, args=(fetch, interval, roster), name="miner-poller", daemon=True)
+            _thread.start()
+    return _thread
+
+def get_snapshot(wait=False):
+    """Return the latest fleet snapshot (optionally wait for the first one)"""
+    if wait and not _ready.is_set():
+        _ready.wait(FIRST_SNAPSHOT_WAIT)
+    return _snapshot
+
+def get_cached_miner(miner_name):
+    """Latest poll result for one miner, or None"""
+    return _snapshot["by_name"].get(miner_name)
@@ -2,8 +2,11 @@
 # -*- coding: utf-8 -*-
 
 import os
-import requests
-from bs4 import BeautifulSoup
+
+from fleet import get_fleet
+from luci_forms import find_token
+from luci_session import LoginError, ensure_authenticated, run_with_session
+from metrics import luci_phase
 
 # Pool Configuration - Easy to change
 POOL1_URL = "stratum+tcp://sha256.poolbinance.com:443"
@@ -12,97 +15,27 @@ POOL3_URL = "stratum+tcp://btc.poolbinance.com:1800"
 POOL_PASSWORD = "123"
 
 # خواندن تنظیمات از environment
-MINER_IP = os.environ.get("MINER_IP")
 MINER_USERNAME = "admin"
 MINER_PASSWORD = os.environ.get("MINER_PASSWORD")
 
-# Map name -> port
-port_map = {
-    "131": 201, "132": 202, "133": 203,
-    "65": 301, "66": 302, "70": 303
-}
-
-# گروه‌بندی ماینرها
-MINER_GROUPS = {
-    "Group A (131-133)": ["131", "132", "133"],
-    "Group B (65-70)": ["65", "66", "70"]
-}
-
-# رنگ‌های مخصوص هر ماینر
-MINER_COLORS = {
-    "131": "#3B82F6", "132": "#10B981", "133": "#8B5CF6",
-    "65": "#F59E0B", "66": "#EF4444", "70": "#EC4899"
-}
-
-# آیکون‌های مخصوص هر ماینر - جدید و خفن‌تر!
-MINER_ICONS = {
-    "131": "🛠️", "132": "🛠️", "133": "🛠️",
-    "65": "🛠️", "66": "🛠️", "70": "🛠️"
-}
-
-# نام‌های فانتزی برای ماینرها
-MINER_NAMES = {
-    "131": "131TH", "132": "132TH", "133": "133TH",
-    "65": "65TH", "66": "66TH", "70": "70TH"
-}
-
-def login_to_miner(miner_name, username, password):
-    """Login to miner and return session"""
-    miner_port = port_map.get(miner_name)
-    if not miner_port:
-        print(f"❌ Port not found for miner {miner_name}")
-        return None
-    
-    base_url = f"https://{MINER_IP}:{miner_port}"
-    login_url = f"{base_url}/cgi-bin/luci"
-    
-    session = requests.Session()
-    session.verify = False
-    requests.packages.urllib3.disable_warnings()
-    
-    try:
-        print(f"🔐 Attempting login to miner {miner_name}...")
-        response = session.get(login_url, timeout=10)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        login_data = {
-            'luci_username': username,
-            'luci_password': password
-        }
-        
-        login_response = session.post(login_url, data=login_data, timeout=10, allow_redirects=False)
-        
-        if login_response.status_code in [302, 303]:
-            print(f"✅ Successfully logged into miner {miner_name}")
-            return session
-        else:
-            print(f"❌ Login failed for miner {miner_name} - Status: {login_response.status_code}")
-            return None
-    except Exception as e:
-        print(f"❌ Login error for miner {miner_name}: {str(e)}")
-        return None
+# آیکون کارت ماینرها (لیست ماینرها، گروه‌ها و رنگ‌ها در fleet.json)
+MINER_ICON = "🛠️"
 
 def update_miner_pools(miner_name, pools_data, username, password):
     """Update pool settings for a miner"""
     print(f"🔄 Starting pool update for miner {miner_name}...")
-    
-    session = login_to_miner(miner_name, username, password)
-    if not session:
-        return {"error": "Login failed"}
-    
-    try:
-        miner_port = port_map.get(miner_name)
-        pool_url_page = f"https://{MINER_IP}:{miner_port}/cgi-bin/luci/admin/network/btminer"
+
+    def apply(session, base_url):
+        pool_url_page = f"{base_url}/cgi-bin/luci/admin/network/btminer"
         
         print(f"📄 Loading pool configuration page for {miner_name}...")
-        response = session.get(pool_url_page, timeout=10)
-        soup = BeautifulSoup(response.text, 'html.parser')
+        with luci_phase("pools", "page_get"):
+            response = ensure_authenticated(session.get(pool_url_page, timeout=10))
         
-        token_input = soup.find('input', {'name': 'token'})
-        if not token_input:
+        token = find_token(response.text)
+        if token is None:
             return {"error": "Cannot find form token"}
         
-        token = token_input.get('value')
         form_data = {
             'token': token,
             'cbi.submit': '1',
@@ -117,7 +50,8 @@ def update_miner_pools(miner_name, pools_data, username, password):
             form_data[f'cbid.pools.default.pool{pool_num}pw'] = pool_info['password']
             print(f"   Pool {pool_num}: {pool_info['url']}")
         
-        update_response = session.post(pool_url_page, data=form_data, timeout=10)
+        with luci_phase("pools", "form_post"):
+            update_response = ensure_authenticated(session.post(pool_url_page, data=form_data, timeout=10))
         
         if update_response.status_code == 200:
             print(f"✅ Pools successfully updated for miner {miner_name}")
@@ -125,11 +59,40 @@ def update_miner_pools(miner_name, pools_data, username, password):
         else:
             print(f"❌ Update failed for {miner_name} - Status: {update_response.status_code}")
             return {"error": f"Update failed with status {update_response.status_code}"}
-            
+
+    try:
+        return run_with_session(miner_name, username, password, apply, operation="pools")
+    except LoginError as e:
+        print(f"❌ Login failed for miner {miner_name}: {e}")
+        return {"error": "Login failed"}
     except Exception as e:
         print(f"❌ Connection error for {miner_name}: {str(e)}")
         return {"error": f"Connection error: {str(e)}"}
 
+def pools_error(pools_data):
+    """Why a pools template cannot be applied, or None"""
+    if not isinstance(pools_data, dict) or not pools_data:
+        return "pools must be an object of pool number -> pool settings"
+    for num, pool in pools_data.items():
+        if not isinstance(pool, dict):
+            return f"Pool {num} must be an object"
+        for key in ("url", "worker", "password"):
+            if not isinstance(pool.get(key), str):
+                return f"Pool {num} is missing {key}"
+        if not pool["worker"]:
+            return f"Pool {num} has an empty worker"
+    return None
+
+def worker_pools(pools_data, miner_name):
+    """Per-miner copy of the pools template: worker Ali -> Ali.131"""
+    # بخش اول worker استخر ۱ (مثلاً Ali) برای هر سه استخر
+    first = pools_data.get("1") or pools_data.get(1) or next(iter(pools_data.values()))
+    main_worker = first["worker"].split(".")[0]
+    return {
+        num: dict(pool, worker=f"{main_worker}.{miner_name}")
+        for num, pool in pools_data.items()
+    }
+
 def get_pools_manager_html():
     """Return HTML for pools management interface"""
     return f'''
@@ -146,8 +109,7 @@ def get_pools_manager_html():
                 <h4>🎯 SELECT MINERS</h4>
                 <div class="group-controls">
                     <button class="group-btn" onclick="selectGroup('all')">SELECT ALL</button>
-                    <button class="group-btn" onclick="selectGroup('A')">GROUP A</button>
-                    <button class="group-btn" onclick="selectGroup('B')">GROUP B</button>
+    {generate_group_buttons_html()}
                     <button class="group-btn" onclick="deselectAll()">CLEAR ALL</button>
                 </div>
             </div>
@@ -256,7 +218,7 @@ def get_pools_manager_html():
     .group-btn:nth-child(1):hover {{ background: #10b981; border-color: #10b981; }}
     .group-btn:nth-child(2):hover {{ background: #3b82f6; border-color: #3b82f6; }}
     .group-btn:nth-child(3):hover {{ background: #8b5cf6; border-color: #8b5cf6; }}
-    .group-btn:nth-child(4):hover {{ background: #ef4444; border-color: #ef4444; }}
+    .group-btn:last-child:hover {{ background: #ef4444; border-color: #ef4444; }}
     
     .action-btn:nth-child(3):hover {{ background: #8b5cf6; border-color: #8b5cf6; }}
     
@@ -653,29 +615,29 @@ def get_pools_manager_html():
         console.log('Selected miners:', selectedMiners);
     }}
 
+    // لیست ماینرها از کارت‌های صفحه خوانده می‌شود (fleet.json)
+    function poolMinerIds(group) {{
+        const scope = group === 'all' ? '' : '.miner-group[data-group="' + group + '"] ';
+        return Array.from(document.querySelectorAll(scope + 'input[name="miners"]')).map(cb => cb.value);
+    }}
+
     function selectGroup(group) {{
-        const miners = {{
-            'all': ['131', '132', '133', '65', '66', '70'],
-            'A': ['131', '132', '133'],
-            'B': ['65', '66', '70']
-        }}[group];
-        
-        miners.forEach(miner => {{
+        poolMinerIds(group).forEach(miner => {{
             const checkbox = document.getElementById('miner_' + miner);
             checkbox.checked = true;
             updateCardState(miner);
         }});
-        
+
         updateSelection();
     }}
 
     function deselectAll() {{
-        ['131', '132', '133', '65', '66', '70'].forEach(miner => {{
+        poolMinerIds('all').forEach(miner => {{
             const checkbox = document.getElementById('miner_' + miner);
             checkbox.checked = false;
             updateCardState(miner);
         }});
-        
+
         updateSelection();
     }}
 
@@ -772,61 +734,50 @@ def get_pools_manager_html():
 
         showNotification('🚀 Starting pool configuration update...', 'info');
         
-        // Update miners sequentially
-        updateMinersSequentially(selectedMiners, poolsData, 0, progressBar, progressText);
+        // سرور همه ماینرها را موازی در یک job به‌روز می‌کند
+        updateMinersBulk(selectedMiners.slice(), poolsData, progressBar, progressText);
     }}
 
-    function updateMinersSequentially(miners, poolsData, currentIndex, progressBar, progressText) {{
-        if (currentIndex >= miners.length) {{
-            progressBar.style.width = '100%';
-            progressText.textContent = '100%';
-            setTimeout(() => {{
-                showNotification('✅ All pool settings updated successfully!', 'success');
-                closePoolsModal();
-                // Reset form
-                document.querySelectorAll('input[type="text"]').forEach(input => input.value = '');
-                deselectAll();
-            }}, 1000);
-            return;
-        }}
-
-        const miner = miners[currentIndex];
-        const progress = ((currentIndex + 1) / miners.length) * 100;
-        progressBar.style.width = progress + '%';
-        progressText.textContent = Math.round(progress) + '%';
-
-        showNotification(`🔄 Configuring Miner ${{miner}} (${{currentIndex + 1}}/${{miners.length}})`, 'info');
-
-        // برای هر ماینر worker مخصوص خودش رو تنظیم کن
-        const minerPoolsData = JSON.parse(JSON.stringify(poolsData));
-        const mainWorker = minerPoolsData[1].worker.split('.')[0]; // گرفتن بخش اول (مثلاً Ali)
-        
-        for (let poolNum in minerPoolsData) {{
-            minerPoolsData[poolNum].worker = mainWorker + '.' + miner; // مثلاً Ali.131
-        }}
-
-        fetch('/update_pools', {{
+    function updateMinersBulk(miners, poolsData, progressBar, progressText) {{
+        fetch('/update_pools_bulk', {{
             method: 'POST',
             headers: {{'Content-Type': 'application/json'}},
             body: JSON.stringify({{
-                miner: miner,
-                pools: minerPoolsData
+                miners: miners,
+                pools: poolsData
             }})
         }})
-        .then(response => response.json())
-        .then(data => {{
-            if (data.success) {{
-                showNotification(`✅ ${{data.success}}`, 'success');
-            }} else {{
-                showNotification(`❌ Miner ${{miner}}: ${{data.error}}`, 'error');
-            }}
-            // Move to next miner
-            updateMinersSequentially(miners, poolsData, currentIndex + 1, progressBar, progressText);
+        .then(response => {{
+            return followJob(response, event => {{
+                if (event.summary) {{
+                    const s = event.summary;
+                    progressBar.style.width = '100%';
+                    progressText.textContent = '100%';
+                    if (s.error) {{
+                        showNotification(`❌ Bulk update failed: ${{s.error}}`, 'error');
+                        return;
+                    }}
+                    setTimeout(() => {{
+                        showNotification(`✅ Pools updated on ${{s.ok}}/${{s.total}} miners (${{s.seconds}}s)`, s.failed ? 'error' : 'success');
+                        closePoolsModal();
+                        // Reset form
+                        document.querySelectorAll('input[type="text"]').forEach(input => input.value = '');
+                        deselectAll();
+                    }}, 1000);
+                    return;
+                }}
+                const progress = (event.done / event.total) * 100;
+                progressBar.style.width = progress + '%';
+                progressText.textContent = Math.round(progress) + '%';
+                if (event.ok) {{
+                    showNotification(`✅ ${{event.result.success}} (${{event.done}}/${{event.total}})`, 'success');
+                }} else {{
+                    showNotification(`❌ Miner ${{event.miner}}: ${{event.result.error}}`, 'error');
+                }}
+            }});
         }})
         .catch(error => {{
-            showNotification(`❌ Error updating miner ${{miner}}: ${{error}}`, 'error');
-            // Continue with next miner even if this one fails
-            updateMinersSequentially(miners, poolsData, currentIndex + 1, progressBar, progressText);
+            showNotification(`❌ Bulk pool update error: ${{error}}`, 'error');
         }});
     }}
 
@@ -913,7 +864,7 @@ def get_pools_manager_html():
 
     // Initialize miner cards
     setTimeout(() => {{
-        ['131', '132', '133', '65', '66', '70'].forEach(miner => {{
+        poolMinerIds('all').forEach(miner => {{
             updateCardState(miner);
         }});
         updateSelection();
@@ -921,28 +872,38 @@ def get_pools_manager_html():
     </script>
     '''
 
+def generate_group_buttons_html():
+    """One select button per fleet group"""
+    return "\n".join(
+        f'''<button class="group-btn" onclick="selectGroup('{key}')">GROUP {key}</button>'''
+        for key in get_fleet()["groups"]
+    )
+
 def generate_miner_groups_html():
     """Generate HTML for miner groups selection"""
+    fleet = get_fleet()
     html = ''
-    for group_name, miners in MINER_GROUPS.items():
+    for index, (group_key, group_name) in enumerate(fleet["groups"].items()):
+        miners = fleet["by_group"].get(group_key, [])
         html += f'''
-        <div class="miner-group">
+        <div class="miner-group" data-group="{group_key}">
             <div class="group-title">
-                <span>{"📊" if "A" in group_name else "🔥"} {group_name}</span>
+                <span>{"📊" if index % 2 == 0 else "🔥"} {group_name}</span>
                 <span class="pool-badge">{len(miners)} MINERS</span>
             </div>
             <div class="miners-grid">
         '''
         
-        for miner in miners:
+        for m in miners:
+            miner = m["name"]
             html += f'''
-                <div class="miner-card" onclick="toggleMiner('{miner}')" style="--miner-color: {MINER_COLORS[miner]}">
+                <div class="miner-card" onclick="toggleMiner('{miner}')" style="--miner-color: {m["color"]}">
                     <div class="miner-info">
-                        <div class="miner-icon">{MINER_ICONS[miner]}</div>
+                        <div class="miner-icon">{MINER_ICON}</div>
                         <div class="miner-details">
-                            <div class="miner-name">{MINER_NAMES[miner]}</div>
+                            <div class="miner-name">{m["label"]}</div>
                             <div class="miner-id">MINER {miner}</div>
-                            <div class="miner-port">Port: {port_map[miner]}</div>
+                            <div class="miner-port">Port: {m["web_port"]}</div>
                         </div>
                         <input type="checkbox" class="miner-checkbox" id="miner_{miner}" name="miners" value="{miner}" onchange="updateCardState('{miner}')">
                     </div>
@@ -3,130 +3,94 @@
 
 import os
 import requests
-from bs4 import BeautifulSoup
+
+from fleet import get_fleet
+from luci_forms import find_script_token
+import luci_schema
+from luci_session import LoginError, ensure_authenticated, invalidate, run_with_session
+from metrics import luci_phase
 
 # ---------------- Config ----------------
-MINER_IP = os.environ.get("MINER_IP", "185.135.229.121")
 MINER_USERNAME = os.environ.get("MINER_USERNAME", "admin")
 MINER_PASSWORD = os.environ.get("MINER_PASSWORD", "alihacker")
+# ریبوت موجی (rolling_reboot.py): اندازه هر موج و حداکثر ماینر خاموش هم‌زمان
+WAVE_SIZE = int(os.environ.get("REBOOT_WAVE_SIZE", 10))
+MAX_DOWN = int(os.environ.get("REBOOT_MAX_DOWN", 10))
 
-# miner -> port map
-port_map = {
-    "131": 201, "132": 202, "133": 203,
-    "65": 301, "66": 302, "70": 303
-}
-
-MINER_GROUPS = {
-    "A": ["131", "132", "133"],
-    "B": ["65", "66", "70"]
-}
-
-MINER_COLORS = {
-    "131": "#3B82F6", "132": "#10B981", "133": "#8B5CF6",
-    "65": "#F59E0B", "66": "#EF4444", "70": "#EC4899"
-}
-
-MINER_ICONS = {
-    "131": "💎", "132": "💎", "133": "💎",
-    "65": "💎", "66": "💎", "70": "💎"
-
-}
+# لیست ماینرها، گروه‌ها و رنگ‌ها در fleet.json
+MINER_ICON = "💎"
 
 # ---------------- Miner control (server-side) ----------------
-def login_to_miner(miner_name, username=MINER_USERNAME, password=MINER_PASSWORD):
-    """
-    Open a session to miner and attempt login. Return requests.Session or None.
-    """
-    miner_port = port_map.get(miner_name)
-    if not miner_port:
-        return None
-    base_url = f"https://{MINER_IP}:{miner_port}"
-    login_url = f"{base_url}/cgi-bin/luci"
-    session = requests.Session()
-    session.verify = False
-    requests.packages.urllib3.disable_warnings()
-    try:
-        # try initial GET (some firmwares need it)
-        session.get(login_url, timeout=6)
-        payload = {"luci_username": username, "luci_password": password}
-        lr = session.post(login_url, data=payload, timeout=8, allow_redirects=False)
-        if lr.status_code in (302, 303):
-            return session
-        # Some firmwares might return 200 but still login — but to be conservative return None
-        return None
-    except Exception:
-        return None
-
 def reboot_miner(miner_name, username=MINER_USERNAME, password=MINER_PASSWORD):
     """
-    Perform reboot on miner using session login -> token extraction -> POST reboot.
+    Perform reboot on miner using pooled session -> token extraction -> POST reboot.
     Returns dict: {"status":"success","message": "..."} or {"status":"error","message":"..."}
     """
-    session = login_to_miner(miner_name, username, password)
-    if not session:
-        return {"status": "error", "message": "Login failed"}
-
-    miner_port = port_map.get(miner_name)
-    if not miner_port:
-        return {"status": "error", "message": "Unknown miner port"}
-
-    try:
-        reboot_page = f"https://{MINER_IP}:{miner_port}/cgi-bin/luci/admin/system/reboot"
-        r = session.get(reboot_page, timeout=8)
+    def reboot(session, base_url):
+        reboot_page = f"{base_url}/cgi-bin/luci/admin/system/reboot"
+        with luci_phase("reboot", "page_get"):
+            r = ensure_authenticated(session.get(reboot_page, timeout=8))
         if r.status_code != 200:
             return {"status": "error", "message": f"Failed to load reboot page (status {r.status_code})"}
 
-        soup = BeautifulSoup(r.text, "html.parser")
-        token_script = None
-        for s in soup.find_all("script"):
-            if s.string and "token" in s.string:
-                token_script = s.string
-                break
-        if not token_script:
+        token = find_script_token(r.text)
+        if token is None:
             return {"status": "error", "message": "Cannot find reboot token in page"}
-
-        start = token_script.find("token: '")
-        if start == -1:
-            return {"status": "error", "message": "Token pattern not found in script"}
-        start += len("token: '")
-        end = token_script.find("'", start)
-        token = token_script[start:end]
         if not token:
             return {"status": "error", "message": "Token extraction failed"}
 
-        reboot_api = f"https://{MINER_IP}:{miner_port}/cgi-bin/luci/admin/system/reboot/call"
-        # try form-encoded first (most luci-like endpoints expect form)
+        reboot_api = f"{base_url}/cgi-bin/luci/admin/system/reboot/call"
+        # form-encoded first (most luci-like endpoints expect form), JSON as fallback;
+        # the format that worked for this firmware is tried first next time
+        statuses = []
         try:
-            resp = session.post(reboot_api, data={"token": token}, timeout=10)
-            if resp.status_code == 200:
-                return {"status": "success", "message": f"Miner {miner_name} reboot initiated"}
-            # fallback: try sending JSON body (some devices may accept)
-            resp2 = session.post(reboot_api, json={"token": token}, timeout=10)
-            if resp2.status_code == 200:
-                return {"status": "success", "message": f"Miner {miner_name} reboot initiated (json)"}
-            return {"status": "error", "message": f"Reboot failed: status {resp.status_code}/{resp2.status_code}"}
+            for fmt in luci_schema.ordered(miner_name, "reboot", luci_schema.REBOOT_FORMATS):
+                body = {"data": {"token": token}} if fmt == "form" else {"json": {"token": token}}
+                with luci_phase("reboot", "form_post"):
+                    resp = ensure_authenticated(session.post(reboot_api, timeout=10, **body))
+                if resp.status_code == 200:
+                    luci_schema.learn(miner_name, "reboot", fmt)
+                    suffix = "" if fmt == "form" else " (json)"
+                    return {"status": "success", "message": f"Miner {miner_name} reboot initiated{suffix}"}
+                statuses.append(str(resp.status_code))
+            luci_schema.forget(miner_name, "reboot")
+            return {"status": "error", "message": f"Reboot failed: status {'/'.join(statuses)}"}
         except requests.exceptions.ConnectTimeout:
             return {"status": "error", "message": "Connection timed out"}
-        except Exception as e:
-            return {"status": "error", "message": str(e)}
+
+    try:
+        result = run_with_session(miner_name, username, password, reboot, operation="reboot")
+        if result.get("status") == "success":
+            # LuCI sessions do not survive the reboot
+            invalidate(miner_name)
+        return result
+    except LoginError:
+        return {"status": "error", "message": "Login failed"}
     except requests.exceptions.ConnectTimeout:
         return {"status": "error", "message": "Connection timed out while loading reboot page"}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
 # ---------------- HTML/JS/CSS generation (safe strings, no f-strings wrapping full block) ----------------
+def generate_group_buttons_html():
+    return "\n".join(
+        '          <button type="button" onclick="selectRebootGroup(\'{k}\')">GROUP {k}</button>'.format(k=key)
+        for key in get_fleet()["groups"]
+    )
+
 def generate_miner_groups_html():
+    fleet = get_fleet()
     parts = []
-    for group_key, miners in MINER_GROUPS.items():
-        # group title A/B mapped to readable name
-        title = "Group A (131-133)" if group_key == "A" else "Group B (65-70)"
+    for group_key, title in fleet["groups"].items():
+        miners = fleet["by_group"].get(group_key, [])
         parts.append('<div class="miner-group" data-group="{}">'.format(group_key))
         parts.append('  <div class="group-title">{}</div>'.format(title))
         parts.append('  <div class="miners-grid">')
-        for m in miners:
-            color = MINER_COLORS.get(m, "#666")
-            icon = MINER_ICONS.get(m, "")
-            port = port_map.get(m, "")
+        for miner in miners:
+            m = miner["name"]
+            color = miner["color"]
+            icon = MINER_ICON
+            port = miner["web_port"]
             parts.append(
                 '<label class="miner-card" id="card_{m}" data-miner="{m}" style="--miner-color:{c}">'.format(m=m, c=color) +
                 '<div class="miner-info">' +
@@ -162,8 +126,7 @@ def get_reboot_manager_html():
         <div><strong>🎯 SELECT MINERS TO REBOOT</strong></div>
         <div class="group-controls">
           <button type="button" onclick="selectRebootGroup('all')">SELECT ALL</button>
-          <button type="button" onclick="selectRebootGroup('A')">GROUP A</button>
-          <button type="button" onclick="selectRebootGroup('B')">GROUP B</button>
+""" + generate_group_buttons_html() + """
           <button type="button" onclick="deselectRebootAll()">CLEAR ALL</button>
         </div>
       </div>
@@ -177,6 +140,10 @@ def get_reboot_manager_html():
 
     <div class="confirmation-section">
       <div><span id="selectedCount">0</span> miners selected</div>
+      <div class="wave-controls">
+        <label>Wave size <input type="number" id="rebootWaveSize" min="1" value='""" + str(WAVE_SIZE) + """'></label>
+        <label>Max down <input type="number" id="rebootMaxDown" min="1" value='""" + str(MAX_DOWN) + """'></label>
+      </div>
       <div class="confirmation-actions">
         <button id="confirmRebootBtn" class="btn-confirm" onclick="confirmReboot()" disabled>CONFIRM REBOOT</button>
         <button id="startRebootBtn" class="btn-start" onclick="startRebootProcess()" style="display:none">START REBOOT PROCESS</button>
@@ -247,12 +214,12 @@ def get_reboot_manager_html():
   };
 
   window.selectRebootGroup = function(group) {
-    const map = {'all':['131','132','133','65','66','70'], 'A': ['131','132','133'], 'B': ['65','66','70']};
-    const list = map[group] || [];
+    // groups come from the rendered cards (fleet.json)
     if (group === 'all') {
       checkboxList().forEach(cb => { cb.checked = true; updateCardVisual(cb); });
     } else {
-      list.forEach(id => { const cb = document.getElementById('reboot_miner_' + id); if (cb) { cb.checked = true; updateCardVisual(cb); } });
+      document.querySelectorAll('#poolsRebootContainer .miner-group[data-group="' + group + '"] .miner-checkbox')
+        .forEach(cb => { cb.checked = true; updateCardVisual(cb); });
     }
     updateSelection();
   };
@@ -274,22 +241,27 @@ def get_reboot_manager_html():
     if (sumEl) { sumEl.style.display = 'none'; sumEl.innerHTML = ''; }
   };
 
-  // fetch with timeout
-  function fetchWithTimeout(url, opts, timeout = 12000) {
-    const controller = new AbortController();
-    const signal = controller.signal;
-    const timer = setTimeout(() => controller.abort(), timeout);
-    return fetch(url, Object.assign({}, opts, { signal })).finally(() => clearTimeout(timer));
-  }
+  const PHASE_TEXT = {
+    waiting: '⏳ Waiting for wave',
+    rebooting: '🔄 Rebooting...',
+    unconfirmed: '⚠️ Reboot call failed, watching:',
+    down: '⚡ Offline, waiting to come back...',
+    online: '✅ Back online',
+    failed: '❌',
+    timeout: '❌',
+    not_rebooted: '❌ Not rebooted:',
+    skipped: '⏭️ Skipped'
+  };
 
   window.startRebootProcess = function() {
     updateSelection();
     if (selected.length === 0) { alert('No miners selected'); return; }
     const total = selected.length;
-    let idx = 0;
+    let finished = 0;
     document.getElementById('rebootProgress').style.width = '0%';
     document.getElementById('rebootProgressText').textContent = '0%';
-    document.getElementById('rebootStatus').textContent = 'Starting reboot sequence...';
+    document.getElementById('rebootStatus').textContent = 'Starting rolling reboot...';
+    document.getElementById('startRebootBtn').disabled = true;
 
     // prepare status rows
     const progressSection = document.getElementById('rebootSummary');
@@ -303,56 +275,59 @@ def get_reboot_manager_html():
       progressSection.appendChild(r);
     });
 
-    function next() {
-      if (idx >= total) {
-        document.getElementById('rebootProgress').style.width = '100%';
-        document.getElementById('rebootProgressText').textContent = '100%';
-        document.getElementById('rebootStatus').textContent = '✅ Finished. See summary below.';
-        // show condensed summary (succeeded/failed)
-        showSummary();
-        setTimeout(() => {
-          document.getElementById('startRebootBtn').style.display = 'none';
-          const confirmBtn = document.getElementById('confirmRebootBtn');
-          if (confirmBtn) confirmBtn.style.display = 'inline-block';
-        }, 800);
+    function done() {
+      document.getElementById('startRebootBtn').disabled = false;
+      document.getElementById('rebootProgress').style.width = '100%';
+      document.getElementById('rebootProgressText').textContent = '100%';
+      // show condensed summary (succeeded/failed)
+      showSummary();
+      setTimeout(() => {
+        document.getElementById('startRebootBtn').style.display = 'none';
+        const confirmBtn = document.getElementById('confirmRebootBtn');
+        if (confirmBtn) confirmBtn.style.display = 'inline-block';
+      }, 800);
+    }
+
+    function onEvent(ev) {
+      if (ev.summary) {
+        const s = ev.summary;
+        document.getElementById('rebootStatus').textContent = s.error
+          ? '❌ ' + s.error
+          : '✅ Finished: ' + s.ok + '/' + s.total + ' back online in ' + s.waves + ' waves (' + s.seconds + 's)';
         return;
       }
-
-      const miner = selected[idx];
-      const row = document.getElementById('status_row_' + miner);
-      if (row) row.textContent = 'Miner ' + miner + ': Rebooting...';
-      // call server endpoint
-      fetchWithTimeout('/reboot_miner', {
-        method: 'POST',
-        headers: {'Content-Type': 'application/json'},
-        body: JSON.stringify({ miner: miner })
-      }, 12000).then(res => {
-        if (!res || !res.ok) throw new Error('Network/HTTP ' + (res ? res.status : 'unknown'));
-        return res.json();
-      }).then(data => {
-        if (data && data.status === 'success') {
-          if (row) row.textContent = 'Miner ' + miner + ': ✅ ' + (data.message || 'OK');
-          results.push({ miner: miner, ok: true, msg: data.message || 'OK' });
-        } else {
-          const msg = (data && (data.message || data.error)) || 'Unknown error';
-          if (row) row.textContent = 'Miner ' + miner + ': ❌ ' + msg;
-          results.push({ miner: miner, ok: false, msg: msg });
-        }
-      }).catch(err => {
-        const msg = (err && err.name === 'AbortError') ? 'Timeout' : (err && err.message ? err.message : 'Network error');
-        if (row) row.textContent = 'Miner ' + miner + ': ❌ ' + msg;
-        results.push({ miner: miner, ok: false, msg: msg });
-      }).finally(() => {
-        idx++;
-        const pct = Math.round((idx / total) * 100);
+      if (ev.miners) {
+        document.getElementById('rebootStatus').textContent = 'Wave ' + ev.wave + ': ' + ev.miners.join(', ');
+        return;
+      }
+      const row = document.getElementById('status_row_' + ev.miner);
+      let text = PHASE_TEXT[ev.phase] || ev.phase;
+      if (ev.message) text += ' ' + ev.message;
+      if (ev.wave) text = '[wave ' + ev.wave + '] ' + text;
+      if (row) row.textContent = 'Miner ' + ev.miner + ': ' + text;
+      if (ev.ok !== undefined) {
+        results.push({ miner: ev.miner, ok: ev.ok, msg: ev.message || ev.phase });
+        transientNotify(ev.ok ? 'success' : 'error', 'Miner ' + ev.miner + ': ' + text);
+        finished++;
+        const pct = Math.round((finished / total) * 100);
         document.getElementById('rebootProgress').style.width = pct + '%';
         document.getElementById('rebootProgressText').textContent = pct + '%';
-        // small safe delay between miners
-        setTimeout(next, 1000);
-      });
+      }
     }
 
-    next();
+    // سرور موج به موج ریبوت می‌کند و تا برگشتن هر موج منتظر می‌ماند
+    fetch('/reboot_rolling', {
+      method: 'POST',
+      headers: {'Content-Type': 'application/json'},
+      body: JSON.stringify({
+        miners: selected.slice(),
+        wave_size: parseInt(document.getElementById('rebootWaveSize').value, 10) || null,
+        max_down: parseInt(document.getElementById('rebootMaxDown').value, 10) || null
+      })
+    }).then(res => followJob(res, onEvent, done)).catch(err => {
+      document.getElementById('rebootStatus').textContent = '❌ ' + (err && err.message ? err.message : 'Network error');
+      done();
+    });
   };
 
   function transientNotify(type, text) {
@@ -452,6 +427,8 @@ def get_reboot_manager_html():
 #poolsRebootContainer .miner-port { font-size:12px; color:#9ca3af; }
 #poolsRebootContainer .miner-checkbox { width:18px; height:18px; margin-left:8px; }
 #poolsRebootContainer .confirmation-section { display:flex; justify-content:space-between; align-items:center; gap:12px; margin-top:8px; }
+#poolsRebootContainer .wave-controls { display:flex; gap:10px; font-size:12px; color:#cbd5e0; }
+#poolsRebootContainer .wave-controls input { width:56px; margin-left:4px; padding:4px 6px; border-radius:6px; border:1px solid #4a5568; background:#1a202c; color:#e2e8f0; }
 #poolsRebootContainer .btn-confirm, #poolsRebootContainer .btn-start { padding:8px 12px; border-radius:8px; border:none; font-weight:700; cursor:pointer; }
 #poolsRebootContainer .btn-confirm { background:#2563eb; color:white; }
 #poolsRebootContainer .btn-start { background:#10b981; color:white; }
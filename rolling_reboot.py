@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+rolling_reboot.py - Rolling fleet reboot in waves, run on the server
+
+Miners are rebooted wave by wave: reboot_miner() runs in parallel for the
+miners of one wave (through bulk.dispatch), then the engine watches the
+miner API until every miner of the wave went down and came back. The next
+wave starts only after that, so at most max_down miners are ever off the
+power feed at once. Miners that do not come back keep counting against
+max_down; when nothing is left of it the rollout stops.
+"""
+
+import os
+import time
+
+import scheduler
+from bulk import dispatch
+from fleet import get_miner
+from miner_api import query_many, run
+from reboot import MAX_DOWN, WAVE_SIZE, reboot_miner
+
+# زمان انتظار برای خاموش شدن و بالا آمدن دوباره ماینر
+DOWN_TIMEOUT = float(os.environ.get("REBOOT_DOWN_TIMEOUT", 90))
+UP_TIMEOUT = float(os.environ.get("REBOOT_UP_TIMEOUT", 600))
+CHECK_INTERVAL = float(os.environ.get("REBOOT_CHECK_INTERVAL", 5))
+PROBE_TIMEOUT = 3.0
+
+def _targets(names):
+    """{name: (host, api_port)} of the names the fleet knows right now"""
+    miners = {n: get_miner(n) for n in names}
+    return {n: (m["host"], m["api_port"]) for n, m in miners.items() if m is not None}
+
+def _alive(names, targets):
+    """{name: bool} from one miner API summary per miner (names without a target are left out)"""
+    names = [n for n in names if n in targets]
+    replies = run(query_many([targets[n] for n in names], {"command": "summary"}, timeout=PROBE_TIMEOUT))
+    return {n: r is not None for n, r in zip(names, replies)}
+
+def _watch(names, targets, emit, wave, errors=None):
+    """
+    Wait until the rebooted miners went down and came back.
+
+    errors holds the miners whose reboot call failed, with its message:
+    the call may have timed out because the miner was already going down,
+    so they are watched as well. Returns {name: "online" | "not_rebooted"
+    | "failed" | "timeout"}.
+    """
+    errors = errors or {}
+    started = time.monotonic()
+    seen_down = set()
+    waiting = set(names)
+    outcome = {}
+    while waiting:
+        time.sleep(CHECK_INTERVAL)
+        elapsed = time.monotonic() - started
+        for name, alive in _alive(sorted(waiting), targets).items():
+            if not alive and name not in seen_down:
+                seen_down.add(name)
+                emit({"miner": name, "wave": wave, "phase": "down"})
+            elif alive and name in seen_down:
+                waiting.discard(name)
+                outcome[name] = "online"
+                scheduler.recheck(name)
+                emit({"miner": name, "wave": wave, "phase": "online", "ok": True,
+                      "seconds": round(elapsed, 1)})
+            elif alive and elapsed >= DOWN_TIMEOUT:
+                # never seen offline: the reboot did not happen (or fell between two checks)
+                waiting.discard(name)
+                if name in errors:
+                    outcome[name] = "failed"
+                    emit({"miner": name, "wave": wave, "phase": "failed", "ok": False,
+                          "message": errors[name]})
+                else:
+                    outcome[name] = "not_rebooted"
+                    emit({"miner": name, "wave": wave, "phase": "not_rebooted", "ok": False,
+                          "message": f"never seen offline in {int(DOWN_TIMEOUT)}s"})
+        if waiting and elapsed >= UP_TIMEOUT:
+            for name in sorted(waiting):
+                outcome[name] = "timeout"
+                emit({"miner": name, "wave": wave, "phase": "timeout", "ok": False,
+                      "message": f"not back after {int(UP_TIMEOUT)}s"})
+            break
+    return outcome
+
+def rolling_reboot(names, emit, wave_size=None, max_down=None, reboot=reboot_miner):
+    """Reboot names wave by wave, emitting progress events; returns the summary"""
+    wave_size = max(1, wave_size or WAVE_SIZE)
+    max_down = max(1, max_down or MAX_DOWN)
+    remaining = [str(n) for n in dict.fromkeys(names)]
+    total = len(remaining)
+    finished = 0
+    send = emit
+
+    def emit(event):
+        # every miner ends with exactly one event carrying "ok"
+        nonlocal finished
+        if "ok" in event:
+            finished += 1
+            event.update(done=finished, total=total)
+        send(event)
+
+    still_down = set()
+    ok, failed = [], []
+    wave = 0
+    started = time.monotonic()
+    while remaining:
+        budget = min(wave_size, max_down - len(still_down))
+        if budget <= 0:
+            for name in remaining:
+                failed.append(name)
+                emit({"miner": name, "phase": "skipped", "ok": False,
+                      "message": f"{len(still_down)} miners still down (max {max_down})"})
+            break
+        wave += 1
+        batch, remaining = remaining[:budget], remaining[budget:]
+        # addresses are fixed for the wave; a fleet reload must not lose a rebooting miner
+        targets = _targets(batch)
+        emit({"wave": wave, "miners": batch})
+        print(f"🔄 Reboot wave {wave}: {', '.join(batch)}")
+
+        rebooted, errors = [], {}
+
+        def on_reboot(event):
+            name, result = event["miner"], event["result"]
+            message = result.get("message") or result.get("error")
+            if event["ok"]:
+                rebooted.append(name)
+                emit({"miner": name, "wave": wave, "phase": "rebooting", "message": message})
+            elif name in targets:
+                # the miner may be going down anyway; the watch decides
+                rebooted.append(name)
+                errors[name] = message
+                emit({"miner": name, "wave": wave, "phase": "unconfirmed", "message": message})
+            else:
+                failed.append(name)
+                emit({"miner": name, "wave": wave, "phase": "failed", "ok": False, "message": message})
+
+        dispatch(batch, reboot, on_reboot)
+
+        outcome = _watch(rebooted, targets, emit, wave, errors) if rebooted else {}
+        still_down |= {n for n, o in outcome.items() if o == "timeout"}
+        ok.extend(n for n in rebooted if outcome.get(n) == "online")
+        failed.extend(n for n in rebooted if outcome.get(n) != "online")
+    return {"total": total, "ok": len(ok), "failed": len(failed), "waves": wave,
+            "still_down": sorted(still_down), "seconds": round(time.monotonic() - started, 1)}
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+scheduler.py - Per-miner poll schedule with backoff for offline miners
+
+Healthy miners are polled every cycle. A miner that stops answering is
+retried after an exponentially growing, jittered delay, and only a fixed
+number of such retries run per cycle, so the cost of a cycle stays flat no
+matter how many miners are dead. A miner that answers again goes straight
+back to the normal schedule.
+"""
+
+import os
+import random
+import threading
+import time
+
+HEALTHY_INTERVAL = float(os.environ.get("POLL_INTERVAL", 10))
+BACKOFF_BASE = float(os.environ.get("POLL_BACKOFF_BASE", HEALTHY_INTERVAL * 2))
+BACKOFF_MAX = float(os.environ.get("POLL_BACKOFF_MAX", 300))
+BACKOFF_JITTER = 0.2
+# حداکثر تعداد ماینر آفلاین که در هر دور دوباره امتحان می‌شود
+MAX_OFFLINE_PROBES = int(os.environ.get("POLL_MAX_OFFLINE_PROBES", 8))
+
+_lock = threading.Lock()
+# name -> {"alive", "failures", "next_due"}
+_state = {}
+
+def _backoff(failures):
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** max(0, failures - 1)))
+    return delay * random.uniform(1 - BACKOFF_JITTER, 1 + BACKOFF_JITTER)
+
+def due(names, now=None):
+    """
+    Names to poll in this cycle.
+
+    Unknown and healthy miners are always due. Offline miners are due once
+    their backoff expired, the longest-waiting first, at most
+    MAX_OFFLINE_PROBES of them.
+    """
+    now = time.monotonic() if now is None else now
+    out, offline = [], []
+    with _lock:
+        for name in set(_state) - set(names):
+            del _state[name]  # removed from the fleet
+        for name in names:
+            st = _state.get(name)
+            if st is None or st["alive"]:
+                out.append(name)
+            elif st["next_due"] <= now:
+                offline.append((st["next_due"], name))
+    offline.sort()
+    out.extend(name for _, name in offline[:MAX_OFFLINE_PROBES])
+    return out
+
+def report(name, alive, now=None):
+    """Record the outcome of one poll"""
+    now = time.monotonic() if now is None else now
+    with _lock:
+        st = _state.setdefault(name, {"alive": True, "failures": 0, "next_due": now})
+        if alive:
+            if not st["alive"]:
+                print(f"✅ Miner {name} is back online")
+            st.update(alive=True, failures=0, next_due=now + HEALTHY_INTERVAL)
+        else:
+            st["failures"] += 1
+            st.update(alive=False, next_due=now + _backoff(st["failures"]))
+
+def recheck(name):
+    """Poll a miner in the next cycle regardless of its backoff (e.g. after a reboot)"""
+    with _lock:
+        st = _state.get(name)
+        if st is not None:
+            st["next_due"] = 0.0
+            st["failures"] = min(st["failures"], 1)
+
+def get_state(name):
+    """Copy of the schedule entry of one miner, or None"""
+    with _lock:
+        st = _state.get(name)
+        return dict(st) if st else None
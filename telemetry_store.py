@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+telemetry_store.py - Persistent SQLite store for poller samples
+
+Samples are buffered in memory and written in batches by one writer
+thread. Every batch is also folded into 1-minute, 1-hour and 1-day
+rollup tables, so long range queries read rollups instead of raw rows.
+Old rows are deleted according to the *_RETENTION_DAYS settings. When
+the database cannot be opened the panel keeps running without it.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+DB_PATH = os.environ.get("TELEMETRY_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "telemetry.db"))
+FLUSH_INTERVAL = float(os.environ.get("TELEMETRY_FLUSH_INTERVAL", 30))
+FLUSH_MAX_SAMPLES = 5000
+PRUNE_INTERVAL = 3600
+
+# روز؛ 0 یعنی هیچ وقت پاک نشود
+RAW_RETENTION_DAYS = float(os.environ.get("TELEMETRY_RAW_RETENTION_DAYS", 7))
+RETENTION_DAYS = {
+    "1m": float(os.environ.get("TELEMETRY_1M_RETENTION_DAYS", 30)),
+    "1h": float(os.environ.get("TELEMETRY_1H_RETENTION_DAYS", 365)),
+    "1d": float(os.environ.get("TELEMETRY_1D_RETENTION_DAYS", 0)),
+}
+
+METRICS = ("hashrate", "power", "board_temp")
+ROLLUPS = {"1m": 60, "1h": 3600, "1d": 86400}
+# bigger spans are answered from coarser tables
+MAX_POINTS = 1500
+
+_lock = threading.Lock()
+_buffer = []
+_flush_now = threading.Event()
+_thread = None
+_error = None        # why the store is off, after start_store() failed
+_local = threading.local()
+
+def _connect():
+    conn = sqlite3.connect(DB_PATH, timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+def _reader():
+    # one read connection per thread (Flask request threads)
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = _connect()
+    return conn
+
+def init_db(conn):
+    cols = ", ".join(f"{m} REAL" for m in METRICS)
+    conn.execute(f"CREATE TABLE IF NOT EXISTS samples (miner TEXT NOT NULL, ts INTEGER NOT NULL, {cols})")
+    conn.execute("CREATE INDEX IF NOT EXISTS samples_miner_ts ON samples (miner, ts)")
+    # prune() deletes by age across all miners; without this it scans the whole table
+    conn.execute("CREATE INDEX IF NOT EXISTS samples_ts ON samples (ts)")
+    agg_cols = ", ".join(f"{m}_n INTEGER, {m}_sum REAL, {m}_min REAL, {m}_max REAL" for m in METRICS)
+    for name in ROLLUPS:
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS rollup_{name} (miner TEXT NOT NULL, bucket INTEGER NOT NULL, {agg_cols}, "
+            f"PRIMARY KEY (miner, bucket)) WITHOUT ROWID"
+        )
+        conn.execute(f"CREATE INDEX IF NOT EXISTS rollup_{name}_bucket ON rollup_{name} (bucket)")
+    conn.commit()
+
+def _upsert_sql(name):
+    cols = ["miner", "bucket"]
+    updates = []
+    for m in METRICS:
+        cols += [f"{m}_n", f"{m}_sum", f"{m}_min", f"{m}_max"]
+        updates += [
+            f"{m}_n = {m}_n + excluded.{m}_n",
+            f"{m}_sum = coalesce({m}_sum, 0) + coalesce(excluded.{m}_sum, 0)",
+            f"{m}_min = min(coalesce({m}_min, excluded.{m}_min), coalesce(excluded.{m}_min, {m}_min))",
+            f"{m}_max = max(coalesce({m}_max, excluded.{m}_max), coalesce(excluded.{m}_max, {m}_max))",
+        ]
+    marks = ", ".join("?" for _ in cols)
+    return (
+        f"INSERT INTO rollup_{name} ({', '.join(cols)}) VALUES ({marks}) "
+        f"ON CONFLICT (miner, bucket) DO UPDATE SET {', '.join(updates)}"
+    )
+
+def _aggregate(rows, seconds):
+    """Fold raw rows into {(miner, bucket): [n, sum, min, max] * metrics}"""
+    out = {}
+    for row in rows:
+        key = (row[0], row[1] - row[1] % seconds)
+        agg = out.get(key)
+        if agg is None:
+            agg = out[key] = [0, None, None, None] * len(METRICS)
+        for i, value in enumerate(row[2:]):
+            if value is None:
+                continue
+            j = i * 4
+            agg[j] += 1
+            agg[j + 1] = value if agg[j + 1] is None else agg[j + 1] + value
+            agg[j + 2] = value if agg[j + 2] is None else min(agg[j + 2], value)
+            agg[j + 3] = value if agg[j + 3] is None else max(agg[j + 3], value)
+    return [(miner, bucket, *agg) for (miner, bucket), agg in out.items()]
+
+def flush(conn):
+    """Write buffered samples and their rollups in one transaction"""
+    global _buffer
+    with _lock:
+        rows, _buffer = _buffer, []
+    if not rows:
+        return 0
+    marks = ", ".join("?" for _ in range(2 + len(METRICS)))
+    with conn:
+        conn.executemany(f"INSERT INTO samples VALUES ({marks})", rows)
+        for name, seconds in ROLLUPS.items():
+            conn.executemany(_upsert_sql(name), _aggregate(rows, seconds))
+    return len(rows)
+
+def prune(conn, now=None):
+    """Delete raw rows and rollups older than their retention"""
+    now = time.time() if now is None else now
+    with conn:
+        if RAW_RETENTION_DAYS > 0:
+            conn.execute("DELETE FROM samples WHERE ts < ?", (int(now - RAW_RETENTION_DAYS * 86400),))
+        for name, days in RETENTION_DAYS.items():
+            if days > 0:
+                conn.execute(f"DELETE FROM rollup_{name} WHERE bucket < ?", (int(now - days * 86400),))
+
+def _run():
+    conn = _connect()
+    init_db(conn)
+    last_prune = 0.0
+    while True:
+        _flush_now.wait(FLUSH_INTERVAL)
+        _flush_now.clear()
+        try:
+            flush(conn)
+            if time.time() - last_prune >= PRUNE_INTERVAL:
+                prune(conn)
+                last_prune = time.time()
+        except Exception as e:
+            print(f"❌ Telemetry store error: {e}")
+
+def start_store():
+    """Start the writer thread once; later calls are no-ops. None when the DB cannot be opened."""
+    global _thread, _error
+    if _thread is not None or _error is not None:
+        return _thread
+    with _lock:
+        if _thread is None and _error is None:
+            try:
+                init_db(_reader())
+            except (sqlite3.Error, OSError) as e:
+                _error = f"{DB_PATH}: {e}"
+                print(f"⚠️ Telemetry store disabled ({_error}); running without persistence")
+                return None
+            _thread = threading.Thread(target=_run, name="telemetry-writer", daemon=True)
+            _thread.start()
+    return _thread
+
+def store_error():
+    """Why the store is off, or None"""
+    return _error
+
+def store_snapshot(snapshot):
+    """Poller listener: buffer one sample per online miner"""
+    if _error is not None:
+        return
+    ts = int(snapshot.get("updated_at") or time.time())
+    rows = []
+    for m in snapshot.get("miners", []):
+        if not m.get("alive"):
+            continue
+        temps = m.get("board_temps") or []
+        rows.append((m.get("miner"), ts, m.get("hashrate"), m.get("power"), max(temps) if temps else None))
+    with _lock:
+        _buffer.extend(rows)
+        size = len(_buffer)
+    if size >= FLUSH_MAX_SAMPLES:
+        _flush_now.set()
+
+def pick_resolution(start, end):
+    span = max(0, end - start)
+    if span <= 3600:
+        return "raw"
+    for name, seconds in ROLLUPS.items():
+        if span / seconds <= MAX_POINTS:
+            return name
+    return "1d"
+
+def query_range(miner, start, end, resolution=None):
+    """Points for one miner between start and end (epoch seconds)"""
+    resolution = resolution or pick_resolution(start, end)
+    conn = _reader()
+    if resolution == "raw":
+        cur = conn.execute(
+            f"SELECT ts, {', '.join(METRICS)} FROM samples WHERE miner = ? AND ts >= ? AND ts <= ? ORDER BY ts",
+            (miner, int(start), int(end)),
+        )
+        points = [{"ts": row[0], **dict(zip(METRICS, row[1:]))} for row in cur]
+        return {"resolution": "raw", "points": points}
+    if resolution not in ROLLUPS:
+        raise ValueError(f"Unknown resolution {resolution}")
+    cols = ", ".join(f"{m}_n, {m}_sum, {m}_min, {m}_max" for m in METRICS)
+    cur = conn.execute(
+        f"SELECT bucket, {cols} FROM rollup_{resolution} WHERE miner = ? AND bucket >= ? AND bucket <= ? ORDER BY bucket",
+        (miner, int(start) - int(start) % ROLLUPS[resolution], int(end)),
+    )
+    points = []
+    for row in cur:
+        point = {"ts": row[0]}
+        for i, m in enumerate(METRICS):
+            n, total, lo, hi = row[1 + i * 4:5 + i * 4]
+            point[m] = {"avg": round(total / n, 2) if n else None, "min": lo, "max": hi}
+        points.append(point)
+    return {"resolution": resolution, "points": points}
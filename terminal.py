@@ -2,73 +2,36 @@
 # -*- coding: utf-8 -*-
 
 import json
-import socket
 
-def send_tcp_json(ip, port, payload, timeout=3.0):
-    """ارسال دستور به ماینر از طریق TCP"""
-    if not ip:
-        return None
-    data = json.dumps(payload).encode("utf-8")
-    try:
-        with socket.create_connection((ip, port), timeout=timeout) as s:
-            s.settimeout(timeout)
-            s.sendall(data)
-            chunks = []
-            while True:
-                try:
-                    chunk = s.recv(4096)
-                    if not chunk:
-                        break
-                    chunks.append(chunk)
-                except socket.timeout:
-                    break
-            raw = b"".join(chunks).decode("utf-8", errors="ignore").strip()
-            if not raw:
-                return None
-            try:
-                return json.loads(raw)
-            except Exception:
-                first = raw.find("{")
-                last = raw.rfind("}")
-                if first != -1 and last != -1 and last > first:
-                    sub = raw[first:last+1]
-                    try:
-                        return json.loads(sub)
-                    except Exception:
-                        return None
-            return None
-    except Exception:
-        return None
-
-def execute_terminal_command(miner_name, command, miner_ip, miner_names, miner_ports):
-    """اجرای دستور ترمینال برای ماینر مشخص"""
+from fleet import find_miner
+from miner_api import send_tcp_json
+
+def execute_terminal_command(miner_name, command, cached=None):
+    """اجرای دستور ترمینال برای ماینر مشخص
+
+    cached: optional lookup(name) -> latest poller result; summary/devs are
+    answered from it instead of opening a new connection to the miner.
+    """
     try:
         if not miner_name:
             return {"error": "No miner provided"}
 
-        # استخراج نام ماینر از ورودی کاربر
-        miner_key = miner_name.split()[0].strip()
-        
-        # پیدا کردن ماینر در لیست
-        if miner_key not in miner_names:
-            # جستجوی جزئی
-            found = None
-            for k in miner_names:
-                if miner_key == k or miner_name.startswith(k) or k in miner_name:
-                    found = k
-                    break
-            if found:
-                miner_key = found
-            else:
-                return {"error": f"Miner {miner_name} not found"}
-
-        # پیدا کردن پورت ماینر - استفاده از MINER_PORTS اصلی
-        idx = miner_names.index(miner_key)
-        port = miner_ports[idx]
-
-        # ارسال دستور به ماینر
-        payload = {"command": command}
-        response = send_tcp_json(miner_ip, port, payload)
+        # پیدا کردن ماینر در fleet (نام، "131 (204)" یا شماره پورت)
+        miner = find_miner(miner_name)
+        if not miner:
+            return {"error": f"Miner {miner_name} not found"}
+        miner_key = miner["name"]
+        port = miner["api_port"]
+
+        # اول از snapshot پولر، در غیر این صورت ارسال دستور به ماینر
+        response = None
+        if cached:
+            snap = cached(miner_key)
+            if snap:
+                response = (snap.get("raw") or {}).get(command)
+        if not response:
+            payload = {"command": command}
+            response = send_tcp_json(miner["host"], port, payload)
 
         if not response:
             return {"error": f"No response from miner {miner_key} on port {port}"}
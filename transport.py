@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+transport.py - Shared HTTPS transport for the miners' web interfaces
+
+All LuCI sessions mount one HTTPAdapter whose connection pools are sized
+to the fleet, so keep-alive connections are reused across operations and
+sessions (cookies travel in headers, not in the connection). The adapter's
+SSLContext remembers the TLS session of every peer and offers it on the
+next connection, turning a full handshake on the miners' slow ARM CPUs
+into an abbreviated one. Ciphers and options are urllib3's, so every
+miner that worked with plain requests still connects.
+"""
+
+import os
+import ssl
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.ssl_ import DEFAULT_CIPHERS
+
+from fleet import get_fleet
+from metrics import Counter
+
+# اتصال‌های باز نگه‌داشته‌شده برای هر ماینر
+CONNECTIONS_PER_MINER = int(os.environ.get("LUCI_CONNECTIONS_PER_MINER", 2))
+MIN_POOLS = 10
+TLS_RESUMPTION = os.environ.get("LUCI_TLS_RESUMPTION", "1") != "0"
+
+TLS_HANDSHAKES = Counter(
+    "luci_tls_handshakes_total", "TLS handshakes with miner web interfaces", ("kind",))
+
+class MinerSSLSocket(ssl.SSLSocket):
+    """SSLSocket that hands its TLS 1.3 session to the context once the ticket arrived"""
+
+    ticket_peer = None
+
+    def recv_into(self, buffer, nbytes=None, flags=0):
+        n = super().recv_into(buffer, nbytes, flags)
+        # TLS 1.3 tickets come after the handshake, with the first data read
+        if self.ticket_peer is not None:
+            session = self.session
+            if session is not None and session.has_ticket:
+                self.context.remember(self.ticket_peer, session)
+                self.ticket_peer = None
+        return n
+
+class MinerSSLContext(ssl.SSLContext):
+    """
+    SSLContext that counts handshakes and, with resume on, caches the TLS
+    session per peer (ip, port) and offers it on the next connection.
+
+    A TLS 1.2 session is known when the handshake finishes; a TLS 1.3 one
+    only once its ticket arrived, see MinerSSLSocket.
+    """
+
+    sslsocket_class = MinerSSLSocket
+
+    def __new__(cls, resume=True):
+        return super().__new__(cls, ssl.PROTOCOL_TLS_CLIENT)
+
+    def __init__(self, resume=True):
+        self.resume = resume
+        self._tls_sessions = {}
+        self._tls_lock = threading.Lock()
+
+    def wrap_socket(self, sock, *args, **kwargs):
+        peer = None
+        if self.resume:
+            try:
+                peer = sock.getpeername()[:2]
+            except OSError:
+                peer = None
+        if peer is not None and "session" not in kwargs:
+            with self._tls_lock:
+                cached = self._tls_sessions.get(peer)
+            if cached is not None:
+                kwargs["session"] = cached
+        try:
+            ssock = super().wrap_socket(sock, *args, **kwargs)
+        except ssl.SSLError:
+            if peer is not None:
+                with self._tls_lock:
+                    self._tls_sessions.pop(peer, None)
+            raise
+        TLS_HANDSHAKES.inc("resumed" if ssock.session_reused else "full")
+        if peer is not None:
+            session = ssock.session
+            if session is not None and (session.has_ticket or ssock.version() != "TLSv1.3"):
+                self.remember(peer, session)
+            else:
+                ssock.ticket_peer = peer
+        return ssock
+
+    def remember(self, peer, session):
+        with self._tls_lock:
+            self._tls_sessions[peer] = session
+
+    def forget(self):
+        with self._tls_lock:
+            self._tls_sessions.clear()
+
+def make_ssl_context(resume=TLS_RESUMPTION):
+    """
+    Client context for self-signed miner certificates, set up like
+    urllib3.util.ssl_.create_urllib3_context() (that one cannot build a
+    subclass): same cipher list, so old firmware that offers only RSA key
+    exchange or SHA1 suites still connects. Tickets stay on for resumption.
+    """
+    ctx = MinerSSLContext(resume)
+    ctx.set_ciphers(DEFAULT_CIPHERS)
+    ctx.options |= ssl.OP_NO_SSLv2 | ssl.OP_NO_SSLv3 | ssl.OP_NO_COMPRESSION
+    ctx.check_hostname = False
+    ctx.verify_mode = ssl.CERT_NONE
+    return ctx
+
+class MinerAdapter(HTTPAdapter):
+    """HTTPAdapter that uses our SSLContext for every miner connection"""
+
+    def __init__(self, ssl_context, **kwargs):
+        self.ssl_context = ssl_context
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["ssl_context"] = self.ssl_context
+        return super().init_poolmanager(*args, **kwargs)
+
+    def proxy_manager_for(self, *args, **kwargs):
+        kwargs["ssl_context"] = self.ssl_context
+        return super().proxy_manager_for(*args, **kwargs)
+
+_lock = threading.Lock()
+_adapter = {"size": 0, "adapter": None}
+
+def get_adapter():
+    """The shared adapter; rebuilt (bigger) when the fleet outgrows it"""
+    size = max(MIN_POOLS, len(get_fleet()["miners"]))
+    current = _adapter["adapter"]
+    if current is not None and _adapter["size"] >= size:
+        return current
+    with _lock:
+        if _adapter["adapter"] is None or _adapter["size"] < size:
+            old = _adapter["adapter"]
+            # the TLS session cache moves over to the new adapter
+            ctx = old.ssl_context if old is not None else make_ssl_context()
+            _adapter["adapter"] = MinerAdapter(
+                ctx, pool_connections=size, pool_maxsize=CONNECTIONS_PER_MINER, max_retries=0)
+            _adapter["size"] = size
+        return _adapter["adapter"]
+
+def new_session(adapter=None):
+    """requests.Session for miner web interfaces on the shared transport"""
+    session = requests.Session()
+    session.verify = False
+    # REQUESTS_CA_BUNDLE/CURL_CA_BUNDLE in the environment would override verify=False
+    session.trust_env = False
+    session.mount("https://", adapter or get_adapter())
+    return session